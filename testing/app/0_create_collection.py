@@ -7,34 +7,60 @@ from pymilvus import (
     utility,
 )
 
+from index_profiles import INDEX_PROFILE, index_params, physical_collection
+
 # Conectar a Milvus
 connections.connect(host="localhost", port="19530")
 
 collection_name = "tfm_embeddings"
 
-# Borrar si ya existe
-if utility.has_collection(collection_name):
-    Collection(collection_name).drop()
-    print(f"🗑️ Colección '{collection_name}' eliminada")
+# La app y la ingesta usan el alias collection_name; la colección real lleva
+# el perfil del índice, y index_profiles.py la sustituye moviendo el alias
+real_name = f"{collection_name}__{INDEX_PROFILE}"
+
+# Borrar si ya existe (el alias y su colección, o una colección sin alias)
+anterior = physical_collection(collection_name)
+if anterior is not None:
+    if anterior != collection_name:
+        utility.drop_alias(collection_name)
+    Collection(anterior).drop()
+    print(f"🗑️ Colección '{anterior}' eliminada")
+if utility.has_collection(real_name):
+    Collection(real_name).drop()
 
 # Definir esquema con auto_id=True
 fields = [
     FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
     FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=1000),
+    # URL de origen: permite reemplazar los fragmentos de una fuente modificada
+    FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=2048),
+    # Tema del fragmento (topics.chunk_topic): clave de partición, las
+    # búsquedas filtradas por tema solo recorren sus particiones
+    FieldSchema(
+        name="tema", dtype=DataType.VARCHAR, max_length=32, is_partition_key=True
+    ),
     FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=384),
 ]
 
 schema = CollectionSchema(
-    fields=fields, description="Embeddings de textos de extranjería"
+    fields=fields,
+    description="Embeddings de textos de extranjería",
+    # Particiones entre las que Milvus reparte los temas (por hash de "tema")
+    num_partitions=8,
 )
 
 # Crear colección
-collection = Collection(name=collection_name, schema=schema)
-print(f"✅ Colección '{collection_name}' creada")
+collection = Collection(name=real_name, schema=schema)
+utility.create_alias(real_name, collection_name)
+print(f"✅ Colección '{real_name}' creada con el alias '{collection_name}'")
 
-# Crear índice para búsquedas
-index_params = {"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 128}}
-collection.create_index(field_name="vector", index_params=index_params)
+# Crear índice para búsquedas con el perfil INDEX_PROFILE (ivf_flat, ivf_sq8,
+# hnsw); se puede cambiar después con index_profiles.py sin reingerir
+params = index_params(INDEX_PROFILE)
+collection.create_index(field_name="vector", index_params=params)
 collection.load()
 
-print("🔎 Índice creado y colección cargada en memoria")
+print(
+    f"🔎 Índice {params['index_type']} (perfil {INDEX_PROFILE}) creado "
+    "y colección cargada en memoria"
+)
@@ -1,11 +1,60 @@
+import aiohttp
 import requests
 from bs4 import BeautifulSoup
 import urllib3
 import json
+import os
+import time
+import asyncio
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
 
 # ⚠️ Desactiva warnings por deshabilitar verificación SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+INPUT_FILE = os.getenv("CRAWL_SEEDS", "enlaces_validos.json")
+OUTPUT_FILE = "enlaces_extranj.json"
+
+# Modo de crawling: "sync" (bucle secuencial original) o "async" (aiohttp)
+CRAWL_MODE = os.getenv("CRAWL_MODE", "sync")
+# Profundidad: 0 = solo las semillas, N = seguir enlaces del mismo host N niveles
+CRAWL_DEPTH = int(os.getenv("CRAWL_DEPTH", "0"))
+# Concurrencia global y por host del crawler asíncrono
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "32"))
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "8"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "10"))
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalizar_url(url):
+    """Normaliza una URL para deduplicar: esquema/host en minúsculas (sin el
+    punto final de un FQDN), sin fragmento, sin puerto por defecto y con los
+    parámetros ordenados."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower().rstrip(".")
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def extraer_enlaces(html, base_url):
+    """Devuelve los enlaces <a href> de un HTML resueltos contra base_url."""
+    soup = BeautifulSoup(html, "lxml")
+    enlaces = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"].strip()
+        if href.startswith("http") or href.startswith("/"):
+            enlaces.append(
+                {
+                    "texto": a.get_text(strip=True),
+                    "url": canonicalizar_url(urljoin(base_url, href)),
+                }
+            )
+    return enlaces
+
 
 def get_all_links(base_url):
     resp = requests.get(base_url, verify=False)
@@ -28,28 +77,128 @@ def get_all_links(base_url):
     return enlaces
 
 
-if __name__ == "__main__":
-    # 1) Carga de URLs desde JSON
-    with open("enlaces_validos.json", "r", encoding="utf-8") as f:
-        entries = json.load(f)
+async def _fetch(session, url):
+    """Descarga una página; devuelve (url final, html o None si no es HTML)."""
+    async with session.get(url) as resp:
+        if "text/html" not in resp.headers.get("Content-Type", ""):
+            return str(resp.url), None
+        return str(resp.url), await resp.text(errors="replace")
 
-    # 2) Scrapeo de cada URL extraída del JSON
+
+async def crawl_async(seeds, depth=CRAWL_DEPTH):
+    """Crawler asíncrono con pool de conexiones keep-alive.
+
+    El conector limita las conexiones simultáneas en total (CRAWL_CONCURRENCY)
+    y por host (CRAWL_PER_HOST), y un semáforo deja como mucho
+    CRAWL_CONCURRENCY peticiones en curso. CRAWL_TIMEOUT se aplica a conectar
+    y a cada lectura del socket, no a la petición entera, para que la espera
+    de una conexión libre del pool no cuente como timeout.
+
+    Recorre las semillas en anchura hasta `depth` niveles, siguiendo solo
+    enlaces de los hosts de las semillas. Cada URL canónica se descarga una
+    única vez y cada enlace se emite una única vez.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=CRAWL_CONCURRENCY,
+        limit_per_host=CRAWL_PER_HOST,
+        ssl=False,
+        keepalive_timeout=30,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None, sock_connect=CRAWL_TIMEOUT, sock_read=CRAWL_TIMEOUT
+    )
+    en_curso = asyncio.Semaphore(CRAWL_CONCURRENCY)
+    # Mismo formato que los enlaces canónicos con los que se compara
+    hosts_permitidos = {urlsplit(canonicalizar_url(s)).netloc for s in seeds}
+
+    visitados = set()
+    emitidos = set()
     all_links = []
-    for entry in entries:
-        url = entry.get("url")
+    paginas = 0
+
+    frontera = []
+    for s in seeds:
+        canon = canonicalizar_url(s)
+        if canon not in visitados:
+            visitados.add(canon)
+            frontera.append(canon)
+
+    async def descargar(session, url):
+        async with en_curso:
+            return await _fetch(session, url)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        for nivel in range(depth + 1):
+            if not frontera:
+                break
+            print(f"🌐 Nivel {nivel}: {len(frontera)} páginas")
+            resultados = await asyncio.gather(
+                *(descargar(session, url) for url in frontera),
+                return_exceptions=True,
+            )
+
+            siguiente = []
+            for url, res in zip(frontera, resultados):
+                if isinstance(res, Exception):
+                    print(f"❌ Error en {url}: {res!r}")
+                    continue
+                final_url, html = res
+                paginas += 1
+                if html is None:
+                    continue
+                for enlace in extraer_enlaces(html, final_url):
+                    canon = enlace["url"]
+                    if canon not in emitidos:
+                        emitidos.add(canon)
+                        all_links.append(enlace)
+                    if (
+                        nivel < depth
+                        and canon not in visitados
+                        and urlsplit(canon).netloc in hosts_permitidos
+                    ):
+                        visitados.add(canon)
+                        siguiente.append(canon)
+            frontera = siguiente
+
+    return all_links, paginas
+
+
+def crawl_sync(seeds):
+    all_links = []
+    for url in seeds:
         print(f"🔍 Scrapeando {url} …")
         try:
             enlaces = get_all_links(url)
             all_links.extend(enlaces)
         except Exception as e:
             print(f"❌ Error en {url}: {e}")
+    return all_links, len(seeds)
+
+
+if __name__ == "__main__":
+    # 1) Carga de URLs desde JSON
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    seeds = [entry.get("url") for entry in entries if entry.get("url")]
+
+    # 2) Scrapeo de cada URL extraída del JSON
+    inicio = time.perf_counter()
+    if CRAWL_MODE == "async":
+        all_links, paginas = asyncio.run(crawl_async(seeds))
+    else:
+        all_links, paginas = crawl_sync(seeds)
+    duracion = time.perf_counter() - inicio
 
     # 3) Mostrar algunos enlaces por consola
     for enlace in all_links[:10]:
         print(f"{enlace['texto']}: {enlace['url']}")
 
     # 4) Guardar resultados a JSON local
-    with open("enlaces_extranj.json", "w", encoding="utf-8") as f:
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(all_links, f, indent=2, ensure_ascii=False)
 
-    print(f"\n✅ Guardados {len(all_links)} enlaces en enlaces_extranj.json")
+    print(f"\n✅ Guardados {len(all_links)} enlaces en {OUTPUT_FILE}")
+    print(
+        f"⏱️ {paginas} páginas en {duracion:.1f}s "
+        f"({paginas / max(duracion, 1e-9):.1f} páginas/s, modo {CRAWL_MODE})"
+    )
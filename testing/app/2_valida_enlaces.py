@@ -1,24 +1,157 @@
+import asyncio
 import json
+import os
+import threading
+import time
 import requests
 import urllib3
 
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+from crawl_manifest import MANIFEST_PATH, build_manifest, save_manifest
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 INPUT_FILE = "enlaces_extranj.json"
 OUTPUT_FILE = "enlaces_validos.json"
 
+# Caché de validación en disco: URL -> status, Content-Type, ETag, Last-Modified
+CACHE_FILE = os.getenv("VALIDATION_CACHE", "validacion_cache.json")
+CACHE_TTL = float(os.getenv("VALIDATION_CACHE_TTL", str(24 * 3600)))
+# Los fallos transitorios (red, timeouts, 5xx) se reintentan mucho antes
+ERROR_TTL = float(os.getenv("VALIDATION_ERROR_TTL", "300"))
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "16"))
+# "head": HEAD por URL con caché; "manifest": un único GET por URL que además
+# genera el manifiesto del que leen las etapas de ingesta
+VALIDATION_MODE = os.getenv("VALIDATION_MODE", "head")
+
+_local = threading.local()
+
+
+def _get_session():
+    """Una sesión con pool keep-alive por hilo (requests.Session no es thread-safe)."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.verify = False
+        _local.session = session
+    return session
+
+
 def cargar_enlaces(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def validar_enlace(url):
+
+def cargar_cache(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"⚠️ Caché ilegible, se ignora: {path}")
+        return {}
+
+
+def guardar_cache(cache, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def es_valido(entrada):
+    return entrada["status"] == 200 and "text/html" in entrada["content_type"]
+
+
+def es_definitivo(entrada):
+    """Si el resultado vale hasta CACHE_TTL: 2xx/3xx, 404 y 410. Un error de
+    red (status 0) o un 5xx puede ser pasajero."""
+    status = entrada["status"]
+    return 200 <= status < 400 or status in (404, 410)
+
+
+def caducada(entrada, ahora, ttl=CACHE_TTL, error_ttl=ERROR_TTL):
+    vigencia = ttl if es_definitivo(entrada) else error_ttl
+    return ahora - entrada["checked_at"] > vigencia
+
+
+def _fallo(status, previa):
+    """Resultado de un fallo transitorio. Si ya había un resultado definitivo
+    se conserva (sin renovar `checked_at`, así que se vuelve a consultar en la
+    siguiente ejecución); si no, queda con `status` y caduca a los ERROR_TTL."""
+    if previa and es_definitivo(previa):
+        return previa
+    return {
+        "status": status,
+        "content_type": "",
+        "etag": None,
+        "last_modified": None,
+        "checked_at": time.time(),
+    }
+
+
+def revalidar_enlace(url, previa=None):
+    """HEAD condicional: si la entrada previa tiene validadores y el servidor
+    responde 304, se conserva el resultado anterior con timestamp renovado.
+    Los errores de red y los 5xx no sustituyen a un resultado definitivo."""
+    headers = {}
+    if previa:
+        if previa.get("etag"):
+            headers["If-None-Match"] = previa["etag"]
+        if previa.get("last_modified"):
+            headers["If-Modified-Since"] = previa["last_modified"]
     try:
-        resp = requests.head(url, allow_redirects=True, verify=False, timeout=5)
-        return resp.status_code == 200 and "text/html" in resp.headers.get("Content-Type", "")
+        resp = _get_session().head(
+            url, allow_redirects=True, timeout=5, headers=headers
+        )
     except Exception:
-        return False
+        return _fallo(0, previa)
+
+    if resp.status_code == 304 and previa:
+        return {**previa, "checked_at": time.time()}
+    if resp.status_code >= 500:
+        return _fallo(resp.status_code, previa)
+    return {
+        "status": resp.status_code,
+        "content_type": resp.headers.get("Content-Type", ""),
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "checked_at": time.time(),
+    }
+
+
+def validar_enlaces(
+    urls, cache, workers=VALIDATION_WORKERS, ttl=CACHE_TTL, error_ttl=ERROR_TTL
+):
+    """Valida en paralelo las URLs cuya entrada de caché falta o ha caducado
+    (a los `ttl` segundos si es definitiva, a los `error_ttl` si no).
+
+    Actualiza `cache` en sitio y devuelve el número de peticiones realizadas.
+    """
+    ahora = time.time()
+    pendientes = [
+        url
+        for url in urls
+        if url not in cache or caducada(cache[url], ahora, ttl, error_ttl)
+    ]
+    if not pendientes:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resultados = pool.map(lambda u: revalidar_enlace(u, cache.get(u)), pendientes)
+        for url, entrada in tqdm(
+            zip(pendientes, resultados), total=len(pendientes), desc="Validando enlaces"
+        ):
+            cache[url] = entrada
+    return len(pendientes)
+
 
 def eliminar_duplicados(enlaces):
     vistos = set()
@@ -30,6 +163,7 @@ def eliminar_duplicados(enlaces):
             unicos.append(item)
     return unicos
 
+
 if __name__ == "__main__":
     print("🔍 Cargando y validando enlaces...")
 
@@ -39,10 +173,29 @@ if __name__ == "__main__":
     enlaces_unicos = eliminar_duplicados(raw_enlaces)
     print(f"✅ Sin duplicados: {len(enlaces_unicos)}")
 
-    enlaces_validos = []
-    for item in tqdm(enlaces_unicos, desc="Validando enlaces"):
-        if validar_enlace(item["url"]):
-            enlaces_validos.append(item)
+    inicio = time.perf_counter()
+    if VALIDATION_MODE == "manifest":
+        previo = cargar_cache(str(MANIFEST_PATH))
+        manifest = asyncio.run(
+            build_manifest([item["url"] for item in enlaces_unicos], previo)
+        )
+        save_manifest(manifest)
+        print(
+            f"🗂️ Manifiesto con {len(manifest)} URLs en {MANIFEST_PATH} "
+            f"({time.perf_counter() - inicio:.1f}s)"
+        )
+        cache = manifest
+    else:
+        cache = cargar_cache(CACHE_FILE)
+        consultados = validar_enlaces([item["url"] for item in enlaces_unicos], cache)
+        guardar_cache(cache, CACHE_FILE)
+        print(
+            f"⚡ {consultados} enlaces consultados, "
+            f"{len(enlaces_unicos) - consultados} servidos desde caché "
+            f"({time.perf_counter() - inicio:.1f}s)"
+        )
+
+    enlaces_validos = [item for item in enlaces_unicos if es_valido(cache[item["url"]])]
 
     print(f"\n✅ Enlaces válidos (200 OK y HTML): {len(enlaces_validos)}")
 
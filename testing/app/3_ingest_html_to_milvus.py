@@ -1,14 +1,28 @@
 import json
+import sys
+import threading
 import requests
-from bs4 import BeautifulSoup
 import urllib3
+from concurrent.futures import ProcessPoolExecutor
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Milvus
 from dotenv import load_dotenv
 import os
 from pathlib import Path
 
+from batch_insert import INGEST_BATCH_CHUNKS, INGEST_MODE, BatchInserter
+from bm25_index import build_index, record_chunks
+from crawl_manifest import Manifest
+from html_extract import extract_text
+from dedup import DEDUP_ENABLED, NearDupIndex
+from embedding_cache import CachedEmbeddings
+from embedding_pool import EMBEDDING_WORKERS
+from embeddings import get_embeddings
+from ingest_ledger import IngestLedger, content_hash, delete_source
+from pipeline import Pipeline, Stage
+from retrieval_cache import mark_collection_changed
+from topics import TOPIC_FIELD, chunk_topic
+
 # Desactivar warnings SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 load_dotenv()
@@ -16,14 +30,22 @@ load_dotenv()
 # Ruta segura al JSON con enlaces válidos
 CURRENT_DIR = Path(__file__).resolve().parent
 ENLACES_PATH = CURRENT_DIR.parent / "enlaces_validos.json"
+LEDGER_PATH = CURRENT_DIR.parent / "ledger_html.json"
+DEDUP_PATH = CURRENT_DIR.parent / "dedup_index.json"
+
+# Pipeline (INGEST_MODE=pipeline): hilos de red y procesos de parseo
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 2)))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
 
 # Conexión a Milvus
 host = os.getenv("MILVUS_HOST", "localhost")
 port = os.getenv("MILVUS_PORT", "19530")
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
+embedding_model = get_embeddings(
+    "sentence-transformers/all-MiniLM-L6-v2", workers=EMBEDDING_WORKERS
 )
+EMBEDDING_DIM = 384
 
 vectorstore = Milvus(
     embedding_function=embedding_model,
@@ -35,24 +57,152 @@ vectorstore = Milvus(
 
 splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
 
+dedup = NearDupIndex(DEDUP_PATH) if DEDUP_ENABLED else None
 
-def extract_text_from_url(url: str) -> str:
-    try:
-        resp = requests.get(url, verify=False, timeout=10)
-        soup = BeautifulSoup(resp.text, "lxml")
+# HTML ya descargado por 2_valida_enlaces.py (VALIDATION_MODE=manifest)
+manifest = Manifest.load()
 
-        for tag in soup(["script", "style", "nav", "footer", "header"]):
-            tag.decompose()
 
-        text = soup.get_text(separator="\n")
-        lines = [line.strip() for line in text.splitlines()]
-        clean_lines = [line for line in lines if line]
-        return "\n".join(clean_lines)
+def extract_text_from_url(url: str) -> str:
+    try:
+        html = manifest.html(url) if manifest else None
+        if html is None:
+            html = requests.get(url, verify=False, timeout=10).text
+        return extract_text(html)
     except Exception as e:
         print(f"❌ Error al procesar {url}: {e}")
         return ""
 
 
+_local = threading.local()
+
+
+def _get_session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.verify = False
+        _local.session = session
+    return session
+
+
+def ingest_pipeline(urls, ledger):
+    """Ingesta en streaming: descarga → parseo → split → embedding → inserción.
+
+    Las descargas corren en hilos, el parseo en un pool de procesos, el
+    embedding en un hilo dedicado y la inserción en otro, unidos por colas
+    acotadas. Cada fuente avanza su estado en el ledger a medida que pasa por
+    las etapas. Devuelve (fuentes omitidas, fragmentos insertados, segundos).
+    """
+    if vectorstore.col is None:
+        print("❌ La colección no existe: ejecuta antes 0_create_collection.py")
+        exit(1)
+
+    lock = threading.Lock()
+    pendientes = {}  # source -> fragmentos por embeber/insertar e IDs ya insertados
+    contadores = {"sin_cambios": 0, "insertados": 0}
+
+    def fetch(url):
+        # Ya completada antes de interrumpirse la ejecución que se retoma
+        if ledger.done_in_job(url):
+            return []
+        # Fuente a medias de una ejecución anterior: se retoma desde su texto
+        raw_text = ledger.load_text(url)
+        if raw_text is not None:
+            return [(url, None, raw_text)]
+        html = manifest.html(url) if manifest else None
+        if html is None:
+            html = _get_session().get(url, timeout=10).text
+        return [(url, html, None)]
+
+    def parse_split(item):
+        url, html, raw_text = item
+        if raw_text is None:
+            raw_text = pool.submit(extract_text, html).result()
+            if not raw_text.strip():
+                print(f"⚠️ Contenido vacío o ilegible: {url}")
+                ledger.skip(url)
+                return []
+            digest = content_hash(raw_text)
+            if ledger.unchanged(url, digest):
+                with lock:
+                    contadores["sin_cambios"] += 1
+                ledger.skip(url)
+                return []
+            ledger.save_text(url, digest, raw_text)
+        delete_source(vectorstore, url)
+        docs = splitter.create_documents([raw_text], metadatas=[{"source": url}])
+        if dedup:
+            dedup.remove_source(url)
+            docs = dedup.filter(docs)
+        ledger.mark(url, "chunked", chunks=len(docs))
+        if not docs:
+            ledger.mark(url, "inserted", ids=[])
+            return []
+        with lock:
+            pendientes[url] = {
+                "por_embeber": len(docs),
+                "por_insertar": len(docs),
+                "ids": [],
+            }
+        return docs
+
+    def embed(docs):
+        vectors = embedding_model.embed_documents([d.page_content for d in docs])
+        with lock:
+            for d in docs:
+                entrada = pendientes[d.metadata["source"]]
+                entrada["por_embeber"] -= 1
+                if entrada["por_embeber"] == 0:
+                    ledger.mark(d.metadata["source"], "embedded")
+        return [(docs, vectors)]
+
+    def insert(item):
+        docs, vectors = item
+        rows = [
+            {"content": d.page_content, "source": d.metadata["source"], "vector": v}
+            for d, v in zip(docs, vectors)
+        ]
+        if TOPIC_FIELD in vectorstore.fields:
+            for row in rows:
+                row[TOPIC_FIELD] = chunk_topic(row["content"])
+        ids = vectorstore.col.insert(rows).primary_keys
+        record_chunks(vectorstore.collection_name, docs, ids)
+        mark_collection_changed(vectorstore.collection_name)
+        with lock:
+            contadores["insertados"] += len(rows)
+            for d, pk in zip(docs, ids):
+                entrada = pendientes[d.metadata["source"]]
+                entrada["ids"].append(pk)
+                entrada["por_insertar"] -= 1
+                if entrada["por_insertar"] == 0:
+                    del pendientes[d.metadata["source"]]
+                    ledger.mark(d.metadata["source"], "inserted", ids=entrada["ids"])
+        return []
+
+    with ProcessPoolExecutor(max_workers=PARSE_WORKERS) as pool:
+        pipeline = Pipeline(
+            [
+                Stage("descarga", fetch, FETCH_WORKERS, PIPELINE_QUEUE_SIZE),
+                Stage("parseo+split", parse_split, PARSE_WORKERS, PIPELINE_QUEUE_SIZE),
+                Stage(
+                    "embedding",
+                    embed,
+                    EMBEDDING_WORKERS,
+                    INGEST_BATCH_CHUNKS * 2,
+                    batch_size=INGEST_BATCH_CHUNKS,
+                ),
+                Stage("inserción", insert, 1, 4),
+            ]
+        )
+        duracion = pipeline.run(urls)
+
+    vectorstore.col.flush()
+    build_index(vectorstore.collection_name)
+    print(pipeline.report(duracion))
+    return contadores["sin_cambios"], contadores["insertados"], duracion
+
+
 if __name__ == "__main__":
     if not ENLACES_PATH.exists():
         print(f"❌ No se encontró el archivo: {ENLACES_PATH}")
@@ -63,15 +213,77 @@ if __name__ == "__main__":
 
     print(f"🔢 Procesando {len(enlaces)} enlaces...\n")
 
+    ledger = IngestLedger(LEDGER_PATH)
+    # --restart descarta la ejecución interrumpida y vuelve a comprobar todo
+    if ledger.start([item["url"] for item in enlaces], "--restart" in sys.argv):
+        print(f"⏯️ Se retoma la ejecución interrumpida: {ledger.progress()}\n")
+    deshechas = ledger.rollback(vectorstore)
+    if deshechas:
+        print(f"↩️ {deshechas} fuentes a medias deshechas; se retoman desde su texto\n")
+
+    if INGEST_MODE == "pipeline":
+        sin_cambios, insertados, duracion = ingest_pipeline(
+            [item["url"] for item in enlaces], ledger
+        )
+        ledger.finish()
+        print(ledger.progress())
+        print(f"📊 {sin_cambios} de {len(enlaces)} enlaces sin cambios (omitidos)")
+        print(
+            f"📊 {insertados} fragmentos en {duracion:.1f}s "
+            f"({insertados / max(duracion, 1e-9):.1f} fragmentos/s, modo pipeline)"
+        )
+        if isinstance(embedding_model, CachedEmbeddings):
+            print(embedding_model.report())
+        if dedup:
+            dedup.save()
+            print(dedup.report(EMBEDDING_DIM))
+        exit(0)
+
+    inserter = BatchInserter(vectorstore, queued=EMBEDDING_WORKERS > 1)
+    sin_cambios = 0
+
     for item in enlaces:
         url = item["url"]
+        if ledger.done_in_job(url):
+            continue
         print(f"🌐 {url}")
-        raw_text = extract_text_from_url(url)
+        raw_text = ledger.load_text(url)
+        if raw_text is not None:
+            print("⏯️ Se retoma desde el texto extraído en la ejecución anterior.")
+        else:
+            raw_text = extract_text_from_url(url)
 
-        if not raw_text.strip():
-            print(f"⚠️ Contenido vacío o ilegible: {url}")
-            continue
+            if not raw_text.strip():
+                print(f"⚠️ Contenido vacío o ilegible: {url}")
+                ledger.skip(url)
+                continue
 
+            digest = content_hash(raw_text)
+            if ledger.unchanged(url, digest):
+                print("⏭️ Sin cambios desde la última ingesta.\n")
+                sin_cambios += 1
+                ledger.skip(url)
+                continue
+            ledger.save_text(url, digest, raw_text)
+
+        # Reemplazar los fragmentos antiguos de esta fuente
+        delete_source(vectorstore, url)
         docs = splitter.create_documents([raw_text], metadatas=[{"source": url}])
-        vectorstore.add_documents(docs)
-        print(f"✅ {len(docs)} fragmentos insertados.\n")
+        if dedup:
+            dedup.remove_source(url)
+            docs = dedup.filter(docs)
+
+        ledger.mark(url, "chunked", chunks=len(docs))
+        inserter.add(docs, **ledger.callbacks(url))
+        print(f"✅ {len(docs)} fragmentos encolados.\n")
+
+    inserter.close()
+    ledger.finish()
+    print(ledger.progress())
+    print(f"📊 {sin_cambios} de {len(enlaces)} enlaces sin cambios (omitidos)")
+    print(inserter.report())
+    if isinstance(embedding_model, CachedEmbeddings):
+        print(embedding_model.report())
+    if dedup:
+        dedup.save()
+        print(dedup.report(EMBEDDING_DIM))
@@ -1,5 +1,6 @@
 import os
 import json
+import sys
 import requests
 import pdfplumber
 from bs4 import BeautifulSoup
@@ -8,9 +9,18 @@ from dotenv import load_dotenv
 import urllib3
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Milvus
 
+from batch_insert import BatchInserter
+from crawl_manifest import Manifest
+from dedup import DEDUP_ENABLED, NearDupIndex
+from embedding_cache import CachedEmbeddings
+from embedding_pool import EMBEDDING_WORKERS
+from embeddings import get_embeddings
+from ingest_ledger import IngestLedger, delete_source, file_hash
+from pdf_download import DownloadValidators, download_pdf
+from pdf_extract import PDF_WORKERS, extract_pdfs, format_stats
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 load_dotenv()
 
@@ -18,14 +28,18 @@ CURRENT_DIR = Path(__file__).resolve().parent
 ENLACES_PATH = CURRENT_DIR.parent / "enlaces_validos.json"
 PDF_DIR = CURRENT_DIR.parent / "pdfs"
 PDF_DIR.mkdir(exist_ok=True)
+LEDGER_PATH = CURRENT_DIR.parent / "ledger_pdfs.json"
+VALIDATORS_PATH = PDF_DIR / "validadores.json"
+DEDUP_PATH = CURRENT_DIR.parent / "dedup_index.json"
 
 # LangChain + Milvus
 host = os.getenv("MILVUS_HOST", "localhost")
 port = os.getenv("MILVUS_PORT", "19530")
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
+embedding_model = get_embeddings(
+    "sentence-transformers/all-MiniLM-L6-v2", workers=EMBEDDING_WORKERS
 )
+EMBEDDING_DIM = 384
 vectorstore = Milvus(
     embedding_function=embedding_model,
     collection_name="tfm_embeddings",
@@ -34,9 +48,18 @@ vectorstore = Milvus(
     auto_id=True,
 )
 splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+ledger = IngestLedger(LEDGER_PATH)
+validators = DownloadValidators(VALIDATORS_PATH)
+dedup = NearDupIndex(DEDUP_PATH) if DEDUP_ENABLED else None
+inserter = BatchInserter(vectorstore, queued=EMBEDDING_WORKERS > 1)
+
+# Content-Type y enlaces a PDF ya registrados por 2_valida_enlaces.py
+manifest = Manifest.load()
 
 
 def is_pdf_url(url):
+    if manifest and url in manifest:
+        return manifest.is_pdf(url)
     try:
         resp = requests.head(url, allow_redirects=True, verify=False, timeout=10)
         return "application/pdf" in resp.headers.get("Content-Type", "")
@@ -45,6 +68,8 @@ def is_pdf_url(url):
 
 
 def find_pdfs_in_html(url):
+    if manifest and url in manifest:
+        return manifest.pdf_links(url)
     try:
         resp = requests.get(url, verify=False, timeout=10)
         soup = BeautifulSoup(resp.text, "lxml")
@@ -61,16 +86,6 @@ def find_pdfs_in_html(url):
         return []
 
 
-def download_pdf(url, path):
-    try:
-        r = requests.get(url, verify=False, timeout=15)
-        with open(path, "wb") as f:
-            f.write(r.content)
-        return True
-    except:
-        return False
-
-
 def extract_text_from_pdf(pdf_path):
     try:
         with pdfplumber.open(pdf_path) as pdf:
@@ -79,26 +94,99 @@ def extract_text_from_pdf(pdf_path):
         return ""
 
 
-def process_and_store_pdf(url):
+def prepare_pdf(url):
+    """Descarga el PDF si hace falta y devuelve (ruta, hash, texto), o None si
+    no hay que procesarlo (ya completado en la ejecución que se retoma, fallo
+    de descarga o contenido sin cambios). El texto solo viene relleno si la
+    fuente quedó a medias y ya estaba extraído."""
+    if ledger.done_in_job(url):
+        return None
     filename = url.split("/")[-1] or f"archivo_{abs(hash(url))}.pdf"
     filepath = PDF_DIR / filename
 
-    if not filepath.exists():
-        print(f"⬇️ Descargando: {filename}")
-        if not download_pdf(url, filepath):
-            print(f"❌ Fallo la descarga: {url}")
-            return
+    print(f"⬇️ Descargando: {filename}")
+    resultado = download_pdf(url, filepath, validators)
+    if resultado is None:
+        print(f"❌ Fallo la descarga: {url}")
+        if not filepath.exists():
+            ledger.skip(url)
+            return None
+        print(f"📂 Se usa la copia local: {filename}")
+    elif resultado == "sin_cambios":
+        print(f"📂 Sin cambios en el servidor (304): {filename}")
+
+    digest = file_hash(filepath)
+    if ledger.unchanged(url, digest):
+        print(f"⏭️ Sin cambios: {filename}\n")
+        ledger.skip(url)
+        return None
+    text = ledger.load_text(url, digest)
+    if text is not None:
+        print(f"⏯️ Se retoma desde el texto extraído: {filename}")
     else:
-        print(f"📂 Ya descargado: {filename}")
+        ledger.mark(url, "fetched", hash=digest)
+    return filepath, digest, text
+
 
-    text = extract_text_from_pdf(filepath)
+def store_pdf(url, filepath, digest, text, resumed=False):
     if not text.strip():
-        print(f"⚠️ Texto vacío en {filename}")
+        print(f"⚠️ Texto vacío en {filepath.name}")
+        ledger.skip(url)
         return
+    if not resumed:
+        ledger.save_text(url, digest, text)
 
+    # Reemplazar los fragmentos antiguos de esta fuente
+    delete_source(vectorstore, url)
     docs = splitter.create_documents([text], metadatas=[{"source": url}])
-    vectorstore.add_documents(docs)
-    print(f"✅ {len(docs)} fragmentos insertados desde {filename}\n")
+    if dedup:
+        dedup.remove_source(url)
+        docs = dedup.filter(docs)
+
+    ledger.mark(url, "chunked", chunks=len(docs))
+    inserter.add(docs, **ledger.callbacks(url))
+    print(f"✅ {len(docs)} fragmentos encolados desde {filepath.name}\n")
+
+
+def process_and_store_pdf(url):
+    preparado = prepare_pdf(url)
+    if preparado is None:
+        return
+    filepath, digest, text = preparado
+    if text is not None:
+        store_pdf(url, filepath, digest, text, resumed=True)
+        return
+    store_pdf(url, filepath, digest, extract_text_from_pdf(filepath))
+
+
+def process_and_store_pdfs(urls):
+    """Procesa varios PDFs extrayendo sus páginas en paralelo (PDF_WORKERS)."""
+    if PDF_WORKERS <= 1:
+        for url in urls:
+            process_and_store_pdf(url)
+        return
+
+    preparados = {}
+    for url in urls:
+        preparado = prepare_pdf(url)
+        if preparado is None:
+            continue
+        filepath, digest, text = preparado
+        if text is not None:
+            store_pdf(url, filepath, digest, text, resumed=True)
+        else:
+            preparados[filepath] = (url, digest)
+
+    for filepath, text, stats in extract_pdfs(list(preparados)):
+        url, digest = preparados[filepath]
+        print(f"⏱️ {filepath.name}: {format_stats(stats)}")
+        store_pdf(url, filepath, digest, text)
+
+
+def iniciar(urls):
+    # --restart descarta la ejecución interrumpida y vuelve a comprobar todo
+    if ledger.start(urls, "--restart" in sys.argv):
+        print(f"⏯️ Se retoma la ejecución interrumpida: {ledger.progress()}\n")
 
 
 if __name__ == "__main__":
@@ -109,13 +197,17 @@ if __name__ == "__main__":
     with open(ENLACES_PATH, "r", encoding="utf-8") as f:
         enlaces = json.load(f)
 
+    deshechas = ledger.rollback(vectorstore)
+    if deshechas:
+        print(f"↩️ {deshechas} fuentes a medias deshechas; se retoman desde su texto\n")
+
     print(f"🔍 Verificando {len(enlaces)} enlaces...\n")
     pdfs_directos = [e["url"] for e in enlaces if is_pdf_url(e["url"])]
 
     if pdfs_directos:
         print(f"📄 Detectados {len(pdfs_directos)} PDF(s) reales por Content-Type\n")
-        for url in pdfs_directos:
-            process_and_store_pdf(url)
+        iniciar(pdfs_directos)
+        process_and_store_pdfs(pdfs_directos)
     else:
         print("ℹ️ No se detectaron PDFs por Content-Type, explorando HTMLs...\n")
         pdfs_indirectos = []
@@ -131,7 +223,17 @@ if __name__ == "__main__":
             print(
                 f"\n📄 Procesando {len(pdfs_indirectos)} PDF(s) encontrados en HTML\n"
             )
-            for url in pdfs_indirectos:
-                process_and_store_pdf(url)
+            iniciar(pdfs_indirectos)
+            process_and_store_pdfs(pdfs_indirectos)
         else:
             print("❌ No se detectaron PDFs ni por Content-Type ni por HTML")
+
+    inserter.close()
+    ledger.finish()
+    print(ledger.progress())
+    print(inserter.report())
+    if isinstance(embedding_model, CachedEmbeddings):
+        print(embedding_model.report())
+    if dedup:
+        dedup.save()
+        print(dedup.report(EMBEDDING_DIM))
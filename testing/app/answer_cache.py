@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from retrieval_cache import collection_version
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+# Coseno mínimo entre preguntas para reutilizar una respuesta
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+NOTA_UE = "\nNota: "
+
+
+def split_question(question):
+    """Separa la pregunta del usuario de la nota UE que añade corregir_contexto."""
+    pregunta, _, nota = question.partition(NOTA_UE)
+    return pregunta, nota
+
+
+class SemanticAnswerCache:
+    """Respuestas ya redactadas, recuperables por similitud de la pregunta.
+
+    Una respuesta se reutiliza si el coseno entre el embedding de la nueva
+    pregunta y el de una pregunta ya respondida supera `threshold`, dentro
+    del mismo ámbito: misma `intencion` y misma nota de ciudadanía UE. Las
+    entradas caducan a los `ttl` segundos, se expulsan por LRU al superar
+    `max_entries` y se descartan todas cuando cambia la colección.
+    """
+
+    def __init__(
+        self,
+        embed_query,
+        collection,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        max_entries=ANSWER_CACHE_SIZE,
+        ttl=ANSWER_CACHE_TTL,
+        enabled=ANSWER_CACHE_ENABLED,
+    ):
+        self.embed_query = embed_query
+        self.collection = collection
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()  # id -> (ámbito, vector, respuesta, creada)
+        self._next_id = 0
+        self._version = collection_version(collection)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _vector(self, pregunta):
+        vector = np.asarray(self.embed_query(pregunta), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _purge(self):
+        version = collection_version(self.collection)
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        limite = time.monotonic() - self.ttl
+        for clave in [k for k, e in self._entries.items() if e[3] < limite]:
+            del self._entries[clave]
+
+    def get(self, question, intencion):
+        """Respuesta cacheada para `question` (con su nota UE) o None."""
+        if not self.enabled:
+            return None
+        pregunta, nota = split_question(question)
+        vector = self._vector(pregunta)
+        ambito = (intencion, nota)
+        with self._lock:
+            self._purge()
+            candidatos = [k for k, e in self._entries.items() if e[0] == ambito]
+            if candidatos:
+                matriz = np.stack([self._entries[k][1] for k in candidatos])
+                similitudes = matriz @ vector
+                mejor = int(np.argmax(similitudes))
+                if similitudes[mejor] >= self.threshold:
+                    self._entries.move_to_end(candidatos[mejor])
+                    self.hits += 1
+                    return self._entries[candidatos[mejor]][2]
+            self.misses += 1
+            return None
+
+    def put(self, question, intencion, answer):
+        if not self.enabled:
+            return
+        pregunta, nota = split_question(question)
+        vector = self._vector(pregunta)
+        with self._lock:
+            self._entries[self._next_id] = (
+                (intencion, nota),
+                vector,
+                answer,
+                time.monotonic(),
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def report(self):
+        total = self.hits + self.misses
+        return (
+            f"💬 Caché de respuestas: {self.hits} aciertos de {total} "
+            f"({self.hits / max(total, 1):.0%}), {len(self._entries)} respuestas guardadas"
+        )
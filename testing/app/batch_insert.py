@@ -0,0 +1,173 @@
+import os
+import queue
+import threading
+import time
+
+from bm25_index import build_index, record_chunks
+from retrieval_cache import mark_collection_changed
+from topics import TOPIC_FIELD, chunk_topic
+
+# Modo de ingesta: "per_doc" (un add_documents por página/PDF) o "batch"
+INGEST_MODE = os.getenv("INGEST_MODE", "per_doc")
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+INGEST_BATCH_BYTES = int(os.getenv("INGEST_BATCH_BYTES", str(1 << 20)))
+# Lotes ya embebidos que pueden esperar a la inserción (modo en cola)
+INSERT_QUEUE_SIZE = int(os.getenv("INSERT_QUEUE_SIZE", "4"))
+
+
+class BatchInserter:
+    """Acumula fragmentos de varios documentos y los inserta por lotes.
+
+    Cada lote supone una única llamada a `embed_documents` y una única
+    inserción en Milvus, cuyas claves primarias se devuelven por documento.
+    El lote se vacía al alcanzar `max_chunks` fragmentos o `max_bytes` bytes
+    de texto; `close()` vacía el resto, hace un único flush de la colección y
+    recompila su índice BM25. Con `batched=False` se inserta documento a
+    documento, igual que el camino original.
+
+    Con `queued=True` el embedding se hace en el hilo que llama a `flush()` y
+    la inserción en Milvus en un hilo aparte, alimentado por una cola
+    acotada, de modo que el siguiente lote se embebe mientras se inserta el
+    anterior (pensado para el pool de procesos de embedding).
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        batched=INGEST_MODE == "batch",
+        max_chunks=INGEST_BATCH_CHUNKS,
+        max_bytes=INGEST_BATCH_BYTES,
+        queued=False,
+    ):
+        self.vectorstore = vectorstore
+        self.batched = batched
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self._docs = []
+        self._bytes = 0
+        self.chunks = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+        self._queue = None
+        self._error = None
+        if queued:
+            self._queue = queue.Queue(maxsize=INSERT_QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._insert_loop, daemon=True)
+            self._thread.start()
+
+    def add(self, docs, on_done=None, on_embedded=None):
+        """Encola los fragmentos de un documento.
+
+        `on_embedded()` se invoca cuando todos sus fragmentos tienen vector y
+        `on_done(ids)` cuando ya están en Milvus, con sus claves primarias.
+        """
+        grupo = {
+            "por_embeber": len(docs),
+            "por_insertar": len(docs),
+            "ids": [],
+            "on_embedded": on_embedded,
+            "on_done": on_done,
+        }
+        if not docs:
+            self._notify(grupo, "on_embedded")
+            self._notify(grupo, "on_done", grupo["ids"])
+        for doc in docs:
+            self._docs.append((doc, grupo))
+            self._bytes += len(doc.page_content.encode("utf-8"))
+            if self.batched and (
+                len(self._docs) >= self.max_chunks or self._bytes >= self.max_bytes
+            ):
+                self.flush()
+        if not self.batched:
+            self.flush()
+
+    @staticmethod
+    def _notify(grupo, evento, *args):
+        if grupo[evento] is not None:
+            grupo[evento](*args)
+
+    def _insert(self, items, vectors):
+        docs = [doc for doc, _ in items]
+        if self.vectorstore.col is None:
+            # La primera inserción crea la colección; add_documents vuelve a
+            # pedir los vectores, que la caché de embeddings ya tiene
+            ids = self.vectorstore.add_documents(docs, batch_size=len(docs))
+        else:
+            campos = set(self.vectorstore.fields)
+            ids = self.vectorstore.col.insert(
+                [
+                    {
+                        k: v
+                        for k, v in {
+                            **d.metadata,
+                            "content": d.page_content,
+                            "vector": vector,
+                            TOPIC_FIELD: chunk_topic(d.page_content),
+                        }.items()
+                        if k in campos
+                    }
+                    for d, vector in zip(docs, vectors)
+                ]
+            ).primary_keys
+        record_chunks(self.vectorstore.collection_name, docs, ids)
+        mark_collection_changed(self.vectorstore.collection_name)
+        for (_, grupo), pk in zip(items, ids):
+            grupo["ids"].append(pk)
+            grupo["por_insertar"] -= 1
+            if grupo["por_insertar"] == 0:
+                self._notify(grupo, "on_done", grupo["ids"])
+
+    def _insert_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._insert(*item)
+            except Exception as e:
+                self._error = e
+
+    def flush(self):
+        if self._error is not None:
+            raise self._error
+        items, self._docs = self._docs, []
+        self._bytes = 0
+        if not items:
+            return
+        self.chunks += len(items)
+        self.batches += 1
+
+        vectors = self.vectorstore.embedding_func.embed_documents(
+            [doc.page_content for doc, _ in items]
+        )
+        for _, grupo in items:
+            grupo["por_embeber"] -= 1
+            if grupo["por_embeber"] == 0:
+                self._notify(grupo, "on_embedded")
+
+        if self._queue is not None:
+            self._queue.put((items, vectors))
+        else:
+            self._insert(items, vectors)
+
+    def close(self):
+        self.flush()
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+            if self._error is not None:
+                raise self._error
+        if self.vectorstore.col is not None:
+            self.vectorstore.col.flush()
+        build_index(self.vectorstore.collection_name)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        modo = "batch" if self.batched else "per_doc"
+        if self._queue is not None:
+            modo += " en cola"
+        return (
+            f"📊 {self.chunks} fragmentos en {self.batches} inserciones, "
+            f"{elapsed:.1f}s ({self.chunks / max(elapsed, 1e-9):.1f} fragmentos/s, "
+            f"modo {modo})"
+        )
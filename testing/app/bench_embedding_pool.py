@@ -0,0 +1,62 @@
+"""Escalado del pool de procesos de embedding con 1, 2, 4 y 8 procesos.
+
+Con 1 proceso el modelo se ejecuta en el proceso principal con todos los
+hilos de torch/ONNX Runtime (el camino habitual de la ingesta); con N > 1 cada
+proceso carga su copia del modelo con núcleos/N hilos. Se usa el modelo sin
+caché de embeddings para medir solo la inferencia.
+
+    python bench_embedding_pool.py [modelo] [n_procesos ...]
+"""
+
+import os
+import sys
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from bench_html_extract import cargar_corpus
+from embeddings import EMBEDDING_BACKEND, get_embeddings
+from html_extract import extract_text
+
+FRAGMENTOS = int(os.getenv("BENCH_FRAGMENTOS", "2048"))
+
+
+def medir(modelo, procesos, fragmentos):
+    inicio = time.perf_counter()
+    embeddings = get_embeddings(
+        modelo, backend=EMBEDDING_BACKEND, workers=procesos, cache=False
+    )
+    # Calentamiento: carga perezosa de pesos y asignación de buffers
+    embeddings.embed_documents(fragmentos[: 8 * procesos])
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    embeddings.embed_documents(fragmentos)
+    duracion = time.perf_counter() - inicio
+    if hasattr(embeddings, "close"):
+        embeddings.close()
+    return carga, len(fragmentos) / duracion
+
+
+if __name__ == "__main__":
+    modelo = sys.argv[1] if len(sys.argv) > 1 else "sentence-transformers/all-MiniLM-L6-v2"
+    niveles = [int(n) for n in sys.argv[2:]] or [1, 2, 4, 8]
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    fragmentos = [
+        c for html in cargar_corpus() for c in splitter.split_text(extract_text(html))
+    ]
+    fragmentos = (fragmentos * (1 + FRAGMENTOS // max(len(fragmentos), 1)))[:FRAGMENTOS]
+    print(
+        f"📊 {modelo} ({EMBEDDING_BACKEND}): {len(fragmentos)} fragmentos, "
+        f"{os.cpu_count()} núcleos\n"
+    )
+
+    base = None
+    for procesos in niveles:
+        carga, docs_s = medir(modelo, procesos, fragmentos)
+        base = base or docs_s
+        print(
+            f"   {procesos} proceso(s): carga {carga:5.1f}s | {docs_s:8.1f} docs/s"
+            f" | x{docs_s / base:4.2f} | eficiencia {docs_s / base / procesos:4.0%}"
+        )
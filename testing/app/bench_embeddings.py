@@ -0,0 +1,100 @@
+"""Benchmark de backends de embeddings: torch vs ONNX Runtime (fp32 e int8).
+
+Para cada modelo mide tiempo de carga, latencia de consulta (p50/p95),
+throughput de documentos y el coseno entre cada backend y torch, sobre
+fragmentos del corpus local de testing/fixtures/html. Se usan los modelos sin
+caché de embeddings para medir solo la inferencia.
+
+    python bench_embeddings.py [modelo ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from bench_html_extract import cargar_corpus
+from html_extract import extract_text
+from onnx_embeddings import OnnxEmbeddings
+
+MODELOS = [
+    "sentence-transformers/all-MiniLM-L6-v2",
+    "sentence-transformers/all-mpnet-base-v2",
+]
+CONSULTAS = [
+    "¿Cómo renuevo el NIE?",
+    "Requisitos de la tarjeta comunitaria para familiares de ciudadanos de la UE",
+    "arraigo social artículo 124",
+    "¿Qué documentación necesito para la residencia no lucrativa?",
+    "plazo de resolución de la solicitud de asilo",
+    "formulario EX-15",
+]
+
+
+def cargar_backend(nombre, modelo):
+    if nombre == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=modelo, model_kwargs={"device": "cpu"})
+    return OnnxEmbeddings(modelo, quantized=nombre == "onnx-int8")
+
+
+def percentil(valores, p):
+    return float(np.percentile(valores, p))
+
+
+def medir(backend, fragmentos, repeticiones=20):
+    latencias = []
+    for _ in range(repeticiones):
+        for consulta in CONSULTAS:
+            inicio = time.perf_counter()
+            backend.embed_query(consulta)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    vectores = np.asarray(backend.embed_documents(fragmentos), dtype=np.float32)
+    duracion = time.perf_counter() - inicio
+    return {
+        "p50_ms": percentil(latencias, 50),
+        "p95_ms": percentil(latencias, 95),
+        "docs_s": len(fragmentos) / duracion,
+        "vectores": vectores,
+    }
+
+
+def coseno(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+if __name__ == "__main__":
+    modelos = sys.argv[1:] or MODELOS
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    fragmentos = [
+        c for html in cargar_corpus() for c in splitter.split_text(extract_text(html))
+    ]
+    # Repetir el corpus para que el throughput no lo dominen los lotes pequeños
+    fragmentos = (fragmentos * (1 + 256 // max(len(fragmentos), 1)))[:256]
+    print(f"📊 {len(fragmentos)} fragmentos, {len(CONSULTAS)} consultas\n")
+
+    for modelo in modelos:
+        print(f"🧠 {modelo}")
+        referencia = None
+        for nombre in ("torch", "onnx", "onnx-int8"):
+            inicio = time.perf_counter()
+            backend = cargar_backend(nombre, modelo)
+            carga = time.perf_counter() - inicio
+            r = medir(backend, fragmentos)
+            if referencia is None:
+                referencia = r["vectores"]
+                acuerdo = "referencia"
+            else:
+                cos = coseno(referencia, r["vectores"])
+                acuerdo = f"coseno medio {cos.mean():.4f}, mínimo {cos.min():.4f}"
+            print(
+                f"   {nombre:>9}: carga {carga:5.1f}s | consulta p50 {r['p50_ms']:6.1f} ms"
+                f" p95 {r['p95_ms']:6.1f} ms | {r['docs_s']:7.1f} docs/s | {acuerdo}"
+            )
+        print()
@@ -0,0 +1,87 @@
+"""Micro-benchmark de los extractores de texto HTML (BeautifulSoup vs lxml).
+
+Mide documentos/s y memoria pico de cada extractor sobre un corpus local
+(testing/fixtures/html y, si existen, las páginas guardadas en el manifiesto)
+y comprueba que ambos producen exactamente la misma salida.
+
+    python bench_html_extract.py [repeticiones]
+"""
+
+import gzip
+import multiprocessing
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from crawl_manifest import PAGES_DIR
+from html_extract import extract_text_bs4, extract_text_lxml
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "html"
+EXTRACTORES = {"bs4": extract_text_bs4, "lxml": extract_text_lxml}
+
+
+def cargar_corpus():
+    docs = [p.read_text(encoding="utf-8") for p in sorted(FIXTURES_DIR.glob("*.html"))]
+    for p in sorted(PAGES_DIR.glob("*.html.gz")):
+        with gzip.open(p, "rt", encoding="utf-8") as f:
+            docs.append(f.read())
+    return docs
+
+
+def _medir(nombre, docs, repeticiones, salida):
+    """Se ejecuta en un proceso hijo para que el RSS máximo sea independiente."""
+    extractor = EXTRACTORES[nombre]
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for html in docs:
+            extractor(html)
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    salida.put(
+        {
+            "docs_s": len(docs) * repeticiones / duracion,
+            "pico_py_mb": pico / 1e6,
+            # ru_maxrss está en KB en Linux
+            "rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_inicial)
+            / 1024,
+        }
+    )
+
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    docs = cargar_corpus()
+    if not docs:
+        print(f"❌ Corpus vacío: añade HTMLs en {FIXTURES_DIR}")
+        sys.exit(1)
+
+    distintos = [
+        i for i, h in enumerate(docs) if extract_text_bs4(h) != extract_text_lxml(h)
+    ]
+    if distintos:
+        print(f"❌ Salidas distintas en {len(distintos)} documentos: {distintos[:10]}")
+    else:
+        print(f"✅ Salida idéntica en los {len(docs)} documentos del corpus")
+
+    print(f"📊 {len(docs)} documentos × {repeticiones} repeticiones\n")
+    ctx = multiprocessing.get_context("spawn")
+    resultados = {}
+    for nombre in EXTRACTORES:
+        cola = ctx.Queue()
+        proc = ctx.Process(target=_medir, args=(nombre, docs, repeticiones, cola))
+        proc.start()
+        resultados[nombre] = cola.get()
+        proc.join()
+        r = resultados[nombre]
+        print(
+            f"{nombre:>5}: {r['docs_s']:8.1f} docs/s"
+            f" | pico Python {r['pico_py_mb']:6.2f} MB | +RSS {r['rss_mb']:6.1f} MB"
+        )
+
+    aceleracion = resultados["lxml"]["docs_s"] / resultados["bs4"]["docs_s"]
+    print(f"\n⚡ Aceleración lxml/bs4: {aceleracion:.1f}×")
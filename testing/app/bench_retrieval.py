@@ -0,0 +1,357 @@
+"""Benchmark offline de recuperación: modelo × índice × parámetros × k.
+
+Con un conjunto etiquetado de preguntas → fuentes relevantes (por defecto
+testing/fixtures/retrieval_eval.json; ver BENCH_ETIQUETAS) mide, para cada
+modelo de embeddings y cada perfil de index_profiles más la búsqueda exacta:
+
+- recall@k (fracción de fuentes relevantes entre los k primeros fragmentos)
+  y MRR (inverso de la posición del primer fragmento relevante),
+- latencia de búsqueda p50/p95 por parámetro (nprobe en IVF, ef en HNSW),
+- memoria del índice y coste de ingesta (fragmentos/s de embedding y
+  tiempo de construcción del índice).
+
+Todo es local y sin red: el corpus son los HTML de testing/fixtures/html y,
+si existe, las páginas guardadas en el manifiesto del crawler, troceados
+como en la ingesta; los índices son réplicas en numpy de IVF_FLAT, IVF_SQ8
+y HNSW con los parámetros de construcción de los perfiles. Las latencias
+sirven para comparar configuraciones entre sí, no como cifras de Milvus.
+Los modelos deben estar ya descargados (HF_HUB_OFFLINE=1).
+
+    python bench_retrieval.py [modelo ...]
+"""
+
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from bench_embeddings import MODELOS, percentil
+from embeddings import get_embeddings
+from html_extract import extract_text
+from index_profiles import PROFILES
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ETIQUETAS_PATH = Path(
+    os.getenv("BENCH_ETIQUETAS", BASE_DIR / "fixtures" / "retrieval_eval.json")
+)
+BENCH_K = [int(k) for k in os.getenv("BENCH_K", "1,3,5,10").split(",")]
+BENCH_REPETICIONES = int(os.getenv("BENCH_REPETICIONES", "5"))
+# Resultados completos en JSON (opcional)
+BENCH_SALIDA = os.getenv("BENCH_SALIDA")
+NPROBES = (1, 4, 16, 64)
+EFS = (16, 64, 256)
+
+
+def _top(distancias, k, ids=None):
+    k = min(k, len(distancias))
+    mejores = np.argpartition(distancias, k - 1)[:k]
+    mejores = mejores[np.argsort(distancias[mejores], kind="stable")]
+    return mejores if ids is None else ids[mejores]
+
+
+def _l2(vectores, q):
+    return ((vectores - q) ** 2).sum(axis=1)
+
+
+class FlatIndex:
+    """Búsqueda exacta: la referencia de recall."""
+
+    def __init__(self, vectores):
+        self.vectores = vectores
+
+    def search(self, q, k):
+        return _top(_l2(self.vectores, q), k)
+
+    @property
+    def nbytes(self):
+        return self.vectores.nbytes
+
+
+def kmeans(vectores, n, iteraciones=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centroides = vectores[rng.choice(len(vectores), n, replace=False)].copy()
+    for _ in range(iteraciones):
+        distancias = (
+            (vectores**2).sum(1)[:, None]
+            - 2 * vectores @ centroides.T
+            + (centroides**2).sum(1)[None, :]
+        )
+        asignacion = distancias.argmin(axis=1)
+        for c in range(n):
+            miembros = vectores[asignacion == c]
+            if len(miembros):
+                centroides[c] = miembros.mean(axis=0)
+    return centroides, asignacion
+
+
+class IVFIndex:
+    """IVF_FLAT (o IVF_SQ8 con `sq8`): listas por k-means y `nprobe` listas
+    recorridas por búsqueda. Con SQ8 cada dimensión se cuantiza a 8 bits."""
+
+    def __init__(self, vectores, nlist, sq8=False):
+        # Milvus necesita al menos nlist vectores para entrenar
+        self.nlist = min(nlist, len(vectores))
+        self.centroides, asignacion = kmeans(vectores, self.nlist)
+        self.listas = [np.flatnonzero(asignacion == c) for c in range(self.nlist)]
+        self.sq8 = sq8
+        if sq8:
+            self.minimo = vectores.min(axis=0)
+            self.escala = np.maximum(vectores.max(axis=0) - self.minimo, 1e-12) / 255
+            self.codigos = np.round((vectores - self.minimo) / self.escala).astype(
+                np.uint8
+            )
+        else:
+            self.vectores = vectores
+
+    def search(self, q, k, nprobe):
+        listas = _top(_l2(self.centroides, q), nprobe)
+        ids = np.concatenate([self.listas[c] for c in listas])
+        if self.sq8:
+            candidatos = self.codigos[ids] * self.escala + self.minimo
+        else:
+            candidatos = self.vectores[ids]
+        return _top(_l2(candidatos, q), k, ids)
+
+    @property
+    def nbytes(self):
+        if self.sq8:
+            datos = self.codigos.nbytes + self.minimo.nbytes + self.escala.nbytes
+        else:
+            datos = self.vectores.nbytes
+        ids = sum(lista.size for lista in self.listas) * 8
+        return datos + self.centroides.nbytes + ids
+
+
+class HNSWIndex:
+    """HNSW: grafo por capas con M vecinos (2M en la capa 0), construido con
+    `ef_construction` candidatos y buscado con `ef`."""
+
+    def __init__(self, vectores, M, ef_construction, seed=0):
+        self.vectores = vectores
+        self.M = M
+        self.mL = 1 / math.log(M)
+        self.capas = []
+        self.entrada = None
+        self.nivel_max = -1
+        rng = random.Random(seed)
+        for i in range(len(vectores)):
+            nivel = int(-math.log(1 - rng.random()) * self.mL)
+            self._insertar(i, nivel, ef_construction)
+
+    def _buscar_capa(self, q, entradas, ef, capa):
+        """(distancia, nodo) de los `ef` nodos más cercanos en la capa."""
+        visitados = set(entradas)
+        distancias = _l2(self.vectores[entradas], q)
+        candidatos = list(zip(distancias, entradas))
+        heapq.heapify(candidatos)
+        mejores = [(-d, n) for d, n in candidatos]
+        heapq.heapify(mejores)
+        while candidatos:
+            d, nodo = heapq.heappop(candidatos)
+            if len(mejores) >= ef and d > -mejores[0][0]:
+                break
+            vecinos = [v for v in self.capas[capa][nodo] if v not in visitados]
+            if not vecinos:
+                continue
+            visitados.update(vecinos)
+            for dv, v in zip(_l2(self.vectores[vecinos], q), vecinos):
+                if len(mejores) < ef or dv < -mejores[0][0]:
+                    heapq.heappush(candidatos, (dv, v))
+                    heapq.heappush(mejores, (-dv, v))
+                    if len(mejores) > ef:
+                        heapq.heappop(mejores)
+        return sorted((-d, n) for d, n in mejores)
+
+    def _insertar(self, i, nivel, ef):
+        while len(self.capas) <= nivel:
+            self.capas.append({})
+        for capa in range(nivel + 1):
+            self.capas[capa][i] = []
+        if self.entrada is None:
+            self.entrada, self.nivel_max = i, nivel
+            return
+        q = self.vectores[i]
+        entradas = [self.entrada]
+        for capa in range(self.nivel_max, nivel, -1):
+            entradas = [self._buscar_capa(q, entradas, 1, capa)[0][1]]
+        for capa in range(min(nivel, self.nivel_max), -1, -1):
+            encontrados = self._buscar_capa(q, entradas, ef, capa)
+            maximo = 2 * self.M if capa == 0 else self.M
+            vecinos = [n for _, n in encontrados[: self.M]]
+            self.capas[capa][i] = vecinos
+            for n in vecinos:
+                lista = self.capas[capa][n]
+                lista.append(i)
+                if len(lista) > maximo:
+                    orden = np.argsort(_l2(self.vectores[lista], self.vectores[n]))
+                    self.capas[capa][n] = [lista[j] for j in orden[:maximo]]
+            entradas = [n for _, n in encontrados]
+        if nivel > self.nivel_max:
+            self.entrada, self.nivel_max = i, nivel
+
+    def search(self, q, k, ef):
+        entradas = [self.entrada]
+        for capa in range(self.nivel_max, 0, -1):
+            entradas = [self._buscar_capa(q, entradas, 1, capa)[0][1]]
+        encontrados = self._buscar_capa(q, entradas, max(ef, k), 0)
+        return np.array([n for _, n in encontrados[:k]])
+
+    @property
+    def nbytes(self):
+        enlaces = sum(len(v) for capa in self.capas for v in capa.values())
+        return self.vectores.nbytes + enlaces * 4
+
+
+def construir(perfil, vectores):
+    """Índice del perfil y los valores de su parámetro de búsqueda."""
+    if perfil == "flat":
+        return FlatIndex(vectores), None, [None]
+    params = PROFILES[perfil]["params"]
+    if perfil == "hnsw":
+        indice = HNSWIndex(vectores, params["M"], params["efConstruction"])
+        return indice, "ef", list(EFS)
+    indice = IVFIndex(vectores, params["nlist"], sq8=perfil == "ivf_sq8")
+    return indice, "nprobe", sorted({min(n, indice.nlist) for n in NPROBES})
+
+
+def cargar_fragmentos():
+    """(fuente, texto) de cada fragmento del corpus local."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    paginas = [
+        (f"fixtures/html/{p.name}", p.read_text(encoding="utf-8"))
+        for p in sorted((BASE_DIR / "fixtures" / "html").glob("*.html"))
+    ]
+    from crawl_manifest import Manifest
+
+    manifest = Manifest.load()
+    if manifest is not None:
+        for url in manifest.entries:
+            html = manifest.html(url)
+            if html:
+                paginas.append((url, html))
+    return [
+        (fuente, texto)
+        for fuente, html in paginas
+        for texto in splitter.split_text(extract_text(html))
+    ]
+
+
+def cargar_etiquetas(fuentes):
+    with open(ETIQUETAS_PATH, encoding="utf-8") as f:
+        etiquetas = json.load(f)
+    validas = [e for e in etiquetas if set(e["sources"]) & fuentes]
+    if len(validas) < len(etiquetas):
+        print(
+            f"⚠️ {len(etiquetas) - len(validas)} preguntas sin fuentes en el corpus local"
+        )
+    return validas
+
+
+def evaluar(indice, consultas, relevantes, fuentes, ks, **params):
+    """recall@k y MRR@k por k, y latencias de búsqueda (con el mayor k)."""
+    kmax = max(ks)
+    latencias = []
+    rankings = []
+    for repeticion in range(BENCH_REPETICIONES):
+        for q in consultas:
+            inicio = time.perf_counter()
+            ids = indice.search(q, kmax, **params)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if repeticion == 0:
+                rankings.append([fuentes[i] for i in ids])
+    metricas = {}
+    for k in ks:
+        recall, mrr = [], []
+        for ranking, relevante in zip(rankings, relevantes):
+            recall.append(len(relevante & set(ranking[:k])) / len(relevante))
+            posicion = next(
+                (p for p, f in enumerate(ranking[:k], 1) if f in relevante), None
+            )
+            mrr.append(1 / posicion if posicion else 0.0)
+        metricas[k] = {"recall": float(np.mean(recall)), "mrr": float(np.mean(mrr))}
+    return metricas, percentil(latencias, 50), percentil(latencias, 95)
+
+
+def bench_modelo(modelo, fragmentos, etiquetas):
+    inicio = time.perf_counter()
+    embeddings = get_embeddings(modelo, cache=False)
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vectores = np.asarray(
+        embeddings.embed_documents([t for _, t in fragmentos]), dtype=np.float32
+    )
+    ingesta = time.perf_counter() - inicio
+    latencias_consulta = []
+    consultas = []
+    for e in etiquetas:
+        inicio = time.perf_counter()
+        consultas.append(np.asarray(embeddings.embed_query(e["question"]), np.float32))
+        latencias_consulta.append((time.perf_counter() - inicio) * 1000)
+    print(
+        f"🧠 {modelo} ({vectores.shape[1]}-d): carga {carga:.1f}s | ingesta "
+        f"{len(fragmentos) / ingesta:.1f} fragmentos/s | embedding de consulta "
+        f"p50 {percentil(latencias_consulta, 50):.1f} ms"
+    )
+
+    fuentes = [f for f, _ in fragmentos]
+    relevantes = [set(e["sources"]) for e in etiquetas]
+    ks = [k for k in BENCH_K if k <= len(fragmentos)]
+    filas = []
+    for perfil in ("flat", *PROFILES):
+        inicio = time.perf_counter()
+        indice, parametro, valores = construir(perfil, vectores)
+        construccion = time.perf_counter() - inicio
+        for valor in valores:
+            params = {parametro: valor} if parametro else {}
+            metricas, p50, p95 = evaluar(
+                indice, consultas, relevantes, fuentes, ks, **params
+            )
+            for k, m in metricas.items():
+                filas.append(
+                    {
+                        "modelo": modelo,
+                        "dim": int(vectores.shape[1]),
+                        "indice": perfil,
+                        "parametro": f"{parametro}={valor}" if parametro else "-",
+                        "k": k,
+                        **m,
+                        "p50_ms": p50,
+                        "p95_ms": p95,
+                        "memoria_mb": indice.nbytes / 1e6,
+                        "construccion_s": construccion,
+                        "ingesta_fragmentos_s": len(fragmentos) / ingesta,
+                    }
+                )
+                print(
+                    f"   {perfil:<8} {filas[-1]['parametro']:<11} k={k:<3} "
+                    f"recall {m['recall']:.3f}  MRR {m['mrr']:.3f} | búsqueda "
+                    f"p50 {p50:6.2f} ms p95 {p95:6.2f} ms | "
+                    f"{indice.nbytes / 1e6:6.2f} MB | construcción {construccion:5.2f}s"
+                )
+    print()
+    return filas
+
+
+if __name__ == "__main__":
+    modelos = sys.argv[1:] or MODELOS
+    fragmentos = cargar_fragmentos()
+    etiquetas = cargar_etiquetas({f for f, _ in fragmentos})
+    print(
+        f"📊 {len(fragmentos)} fragmentos, {len(etiquetas)} preguntas etiquetadas "
+        f"({ETIQUETAS_PATH.name}), k = {', '.join(map(str, BENCH_K))}\n"
+    )
+    resultados = [
+        fila for m in modelos for fila in bench_modelo(m, fragmentos, etiquetas)
+    ]
+    if BENCH_SALIDA:
+        with open(BENCH_SALIDA, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados en {BENCH_SALIDA}")
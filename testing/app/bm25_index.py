@@ -0,0 +1,317 @@
+"""Índice léxico BM25 de cada colección, junto a Milvus.
+
+La ingesta apunta en `<BM25_INDEX_DIR>/<colección>/log.jsonl` cada fragmento
+insertado (con su clave primaria de Milvus) y cada fuente borrada, y al
+cerrar compila el log en un índice invertido compacto (CSR en `.npy`):
+vocabulario, offsets, documentos y frecuencias por término, longitudes y
+los textos. La app lo abre con `mmap` y lo vuelve a cargar cuando la ingesta
+marca la colección como cambiada.
+
+Para colecciones ingeridas antes de existir el log:
+`python bm25_index.py <colección> --desde-milvus` lo reconstruye leyendo
+`content` y `source` de Milvus.
+"""
+
+import fcntl
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from retrieval_cache import collection_version, mark_collection_changed
+
+BM25_INDEX_DIR = Path(
+    os.getenv("BM25_INDEX_DIR", Path(__file__).resolve().parent.parent / "bm25_index")
+)
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Palabras y números, con los compuestos con guion ("ex-15") como un token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a al como con de del el en es la las lo los o para por que se su sus un una y".split()
+)
+
+
+def tokenize(texto):
+    """Tokens en minúsculas y sin tildes; "EX-15" da "ex-15", "ex" y "15"."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    tokens = []
+    for token in _TOKEN_RE.findall(texto):
+        if "-" in token:
+            tokens.append(token)
+            tokens.extend(token.split("-"))
+        else:
+            tokens.append(token)
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+def _dir(collection):
+    return BM25_INDEX_DIR / collection
+
+
+@contextmanager
+def _bloqueo_log(carpeta):
+    """Bloqueo exclusivo del log entre procesos (las ingestas de HTML y PDF
+    son procesos distintos que escriben en el mismo log)."""
+    with open(carpeta / "log.lock", "a") as cerrojo:
+        fcntl.flock(cerrojo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(cerrojo, fcntl.LOCK_UN)
+
+
+def _append(collection, registros):
+    carpeta = _dir(collection)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    with _bloqueo_log(carpeta), open(carpeta / "log.jsonl", "a", encoding="utf-8") as f:
+        for registro in registros:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def record_chunks(collection, docs, ids):
+    """Apunta en el log los fragmentos recién insertados en Milvus."""
+    _append(
+        collection,
+        [
+            {
+                "op": "add",
+                "id": pk,
+                "source": d.metadata.get("source"),
+                "content": d.page_content,
+            }
+            for d, pk in zip(docs, ids)
+        ],
+    )
+
+
+def record_delete(collection, source):
+    """Apunta que los fragmentos de `source` se han borrado de Milvus."""
+    _append(collection, [{"op": "delete", "source": source}])
+
+
+def _live_chunks(collection):
+    """Fragmentos vigentes según el log, en orden de inserción."""
+    vivos = {}
+    por_fuente = {}
+    ruta = _dir(collection) / "log.jsonl"
+    if not ruta.exists():
+        return []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            registro = json.loads(linea)
+            if registro.pop("op") == "delete":
+                for pk in por_fuente.pop(registro["source"], ()):
+                    vivos.pop(pk, None)
+            else:
+                vivos[registro["id"]] = registro
+                por_fuente.setdefault(registro["source"], []).append(registro["id"])
+    return list(vivos.values())
+
+
+def _write_atomic(carpeta, nombre, escribir):
+    tmp = carpeta / f"{nombre}.tmp"
+    escribir(tmp)
+    os.replace(tmp, carpeta / nombre)
+
+
+def build_index(collection, chunks=None):
+    """Compila el log (o `chunks`) en el índice y compacta el log.
+
+    Se escribe en un directorio nuevo que sustituye al anterior, de modo que
+    la app nunca ve un índice a medias. Todo se hace con el log bloqueado:
+    ninguna ingesta puede apuntar fragmentos que la compactación descarte ni
+    sustituir el índice a la vez. Devuelve el número de fragmentos.
+    """
+    carpeta = _dir(collection)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    with _bloqueo_log(carpeta):
+        return _compile(collection, carpeta, chunks)
+
+
+def _compile(collection, carpeta, chunks):
+    if chunks is None:
+        chunks = _live_chunks(collection)
+
+    # Log compactado: solo las altas vigentes
+    def escribir_log(ruta):
+        with open(ruta, "w", encoding="utf-8") as f:
+            for c in chunks:
+                f.write(json.dumps({"op": "add", **c}, ensure_ascii=False) + "\n")
+
+    _write_atomic(carpeta, "log.jsonl", escribir_log)
+
+    postings = {}
+    longitudes = np.zeros(len(chunks), dtype=np.int32)
+    for i, chunk in enumerate(chunks):
+        tokens = tokenize(chunk["content"])
+        longitudes[i] = len(tokens)
+        frecuencias = {}
+        for t in tokens:
+            frecuencias[t] = frecuencias.get(t, 0) + 1
+        for t, tf in frecuencias.items():
+            postings.setdefault(t, []).append((i, tf))
+
+    vocabulario = sorted(postings)
+    offsets = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+    for j, t in enumerate(vocabulario):
+        offsets[j + 1] = offsets[j] + len(postings[t])
+    doc_ids = np.empty(offsets[-1], dtype=np.int32)
+    tfs = np.empty(offsets[-1], dtype=np.uint16)
+    for j, t in enumerate(vocabulario):
+        lista = np.asarray(postings[t], dtype=np.int64).reshape(-1, 2)
+        doc_ids[offsets[j] : offsets[j + 1]] = lista[:, 0]
+        tfs[offsets[j] : offsets[j + 1]] = np.minimum(lista[:, 1], 65535)
+
+    nuevo = carpeta / f"index.{os.getpid()}.tmp"
+    shutil.rmtree(nuevo, ignore_errors=True)
+    nuevo.mkdir()
+    np.save(nuevo / "offsets.npy", offsets)
+    np.save(nuevo / "doc_ids.npy", doc_ids)
+    np.save(nuevo / "tfs.npy", tfs)
+    np.save(nuevo / "lengths.npy", longitudes)
+    with open(nuevo / "vocab.json", "w", encoding="utf-8") as f:
+        json.dump(vocabulario, f, ensure_ascii=False)
+    with open(nuevo / "docs.jsonl", "w", encoding="utf-8") as f:
+        for c in chunks:
+            f.write(
+                json.dumps(
+                    {"id": c["id"], "source": c["source"], "content": c["content"]},
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+    anterior = carpeta / f"index.{os.getpid()}.old"
+    if (carpeta / "index").exists():
+        os.replace(carpeta / "index", anterior)
+    os.replace(nuevo, carpeta / "index")
+    shutil.rmtree(anterior, ignore_errors=True)
+    mark_collection_changed(collection)
+    return len(chunks)
+
+
+class BM25Index:
+    """Búsqueda BM25 sobre el índice compilado de una colección.
+
+    Los arrays se abren con mmap y el vocabulario y los textos se cargan en
+    memoria. Antes de cada búsqueda se comprueba la marca de versión de la
+    colección y, si cambió, se recarga el índice. Sin índice en disco las
+    búsquedas devuelven una lista vacía.
+    """
+
+    def __init__(self, collection, k1=BM25_K1, b=BM25_B):
+        self.collection = collection
+        self.k1 = k1
+        self.b = b
+        self._version = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        self._version = collection_version(self.collection)
+        carpeta = _dir(self.collection) / "index"
+        if not (carpeta / "vocab.json").exists():
+            print(f"⚠️ Sin índice BM25 para {self.collection}: solo búsqueda densa")
+            self.vocab, self.docs = {}, []
+            return
+        with open(carpeta / "vocab.json", encoding="utf-8") as f:
+            self.vocab = {t: j for j, t in enumerate(json.load(f))}
+        with open(carpeta / "docs.jsonl", encoding="utf-8") as f:
+            self.docs = [json.loads(linea) for linea in f]
+        self.offsets = np.load(carpeta / "offsets.npy", mmap_mode="r")
+        self.doc_ids = np.load(carpeta / "doc_ids.npy", mmap_mode="r")
+        self.tfs = np.load(carpeta / "tfs.npy", mmap_mode="r")
+        self.lengths = np.load(carpeta / "lengths.npy", mmap_mode="r")
+        # Parte del denominador de BM25 que solo depende de cada fragmento
+        avgdl = float(self.lengths.mean()) if len(self.docs) else 1.0
+        self._normas = self.k1 * (1 - self.b + self.b * self.lengths / max(avgdl, 1e-9))
+
+    def __len__(self):
+        return len(self.docs)
+
+    def scores(self, question):
+        """Puntuación BM25 de cada fragmento del índice para `question`."""
+        with self._lock:
+            if collection_version(self.collection) != self._version:
+                self._load()
+            n = len(self.docs)
+            puntuaciones = np.zeros(n, dtype=np.float32)
+            if not n:
+                return puntuaciones
+            for t in set(tokenize(question)):
+                j = self.vocab.get(t)
+                if j is None:
+                    continue
+                inicio, fin = self.offsets[j], self.offsets[j + 1]
+                docs = self.doc_ids[inicio:fin]
+                tf = self.tfs[inicio:fin].astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                puntuaciones[docs] += (
+                    idf * tf * (self.k1 + 1) / (tf + self._normas[docs])
+                )
+            return puntuaciones
+
+    def search(self, question, k=4):
+        """Los `k` fragmentos con mayor puntuación BM25 (solo los que puntúan)."""
+        from langchain_core.documents import Document
+
+        puntuaciones = self.scores(question)
+        k = min(k, int(np.count_nonzero(puntuaciones)))
+        if k == 0:
+            return []
+        mejores = np.argpartition(-puntuaciones, k - 1)[:k]
+        mejores = mejores[np.argsort(-puntuaciones[mejores], kind="stable")]
+        return [
+            Document(
+                page_content=self.docs[i]["content"],
+                metadata={"pk": self.docs[i]["id"], "source": self.docs[i]["source"]},
+            )
+            for i in mejores
+        ]
+
+
+def _chunks_from_milvus(collection):
+    from pymilvus import Collection, connections
+
+    connections.connect(
+        host=os.getenv("MILVUS_HOST", "localhost"),
+        port=os.getenv("MILVUS_PORT", "19530"),
+    )
+    col = Collection(collection)
+    pk = col.schema.primary_field.name
+    iterador = col.query_iterator(
+        batch_size=1000, expr="", output_fields=[pk, "content", "source"]
+    )
+    chunks = []
+    while lote := iterador.next():
+        chunks.extend(
+            {"id": r[pk], "source": r.get("source"), "content": r["content"]}
+            for r in lote
+        )
+    iterador.close()
+    return chunks
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python bm25_index.py <colección> [--desde-milvus]")
+        sys.exit(1)
+    coleccion = sys.argv[1]
+    inicio = time.perf_counter()
+    chunks = _chunks_from_milvus(coleccion) if "--desde-milvus" in sys.argv else None
+    total = build_index(coleccion, chunks)
+    print(
+        f"🔤 Índice BM25 de {coleccion}: {total} fragmentos en "
+        f"{time.perf_counter() - inicio:.1f}s → {_dir(coleccion) / 'index'}"
+    )
@@ -0,0 +1,175 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MANIFEST_PATH = BASE_DIR / "crawl_manifest.json"
+PAGES_DIR = BASE_DIR / "paginas"
+
+# Las etapas posteriores leen del manifiesto si existe (USE_MANIFEST=0 lo ignora)
+USE_MANIFEST = os.getenv("USE_MANIFEST", "1") != "0"
+MANIFEST_CONCURRENCY = int(os.getenv("MANIFEST_CONCURRENCY", "32"))
+MANIFEST_PER_HOST = int(os.getenv("MANIFEST_PER_HOST", "8"))
+MANIFEST_TIMEOUT = float(os.getenv("MANIFEST_TIMEOUT", "15"))
+
+
+def extraer_links(html, base_url):
+    """Devuelve (outlinks, pdf_links) absolutos de un HTML."""
+    soup = BeautifulSoup(html, "lxml")
+    outlinks = []
+    pdf_links = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"].strip()
+        if not (href.startswith("http") or href.startswith("/")):
+            continue
+        link = urljoin(base_url, href)
+        outlinks.append(link)
+        if ".pdf" in href.lower():
+            pdf_links.append(link)
+    return outlinks, pdf_links
+
+
+def _body_path(url):
+    return PAGES_DIR / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html.gz")
+
+
+async def _fetch_entry(session, url, previa):
+    """GET condicional de una URL; el HTML se guarda comprimido en PAGES_DIR."""
+    headers = {}
+    if previa and previa.get("body"):
+        if previa.get("etag"):
+            headers["If-None-Match"] = previa["etag"]
+        if previa.get("last_modified"):
+            headers["If-Modified-Since"] = previa["last_modified"]
+
+    async with session.get(url, headers=headers) as resp:
+        if resp.status == 304 and previa:
+            return {**previa, "fetched_at": time.time()}
+
+        content_type = resp.headers.get("Content-Type", "")
+        entry = {
+            "url": url,
+            "final_url": str(resp.url),
+            "status": resp.status,
+            "content_type": content_type,
+            "size": int(resp.headers.get("Content-Length") or 0),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "outlinks": [],
+            "pdf_links": [],
+            "body": None,
+            "fetched_at": time.time(),
+        }
+        # Solo se descarga el cuerpo de las páginas HTML válidas
+        if resp.status == 200 and "text/html" in content_type:
+            html = await resp.text(errors="replace")
+            entry["size"] = len(html.encode("utf-8"))
+            entry["outlinks"], entry["pdf_links"] = extraer_links(
+                html, entry["final_url"]
+            )
+            path = _body_path(url)
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write(html)
+            entry["body"] = path.name
+        return entry
+
+
+async def build_manifest(urls, previo=None):
+    """Recorre las URLs en una sola pasada y devuelve {url: entrada}.
+
+    Cada entrada registra URL final, status, Content-Type, tamaño, validadores,
+    outlinks y enlaces a PDF. Las URLs con error quedan con status 0.
+
+    Como mucho hay MANIFEST_CONCURRENCY peticiones en curso, y
+    MANIFEST_TIMEOUT se aplica a conectar y a cada lectura del socket, de modo
+    que esperar una conexión libre del pool no agota el timeout.
+    """
+    previo = previo or {}
+    PAGES_DIR.mkdir(exist_ok=True)
+    connector = aiohttp.TCPConnector(
+        limit=MANIFEST_CONCURRENCY, limit_per_host=MANIFEST_PER_HOST, ssl=False
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None, sock_connect=MANIFEST_TIMEOUT, sock_read=MANIFEST_TIMEOUT
+    )
+    en_curso = asyncio.Semaphore(MANIFEST_CONCURRENCY)
+
+    async def descargar(session, url):
+        async with en_curso:
+            return await _fetch_entry(session, url, previo.get(url))
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        resultados = await asyncio.gather(
+            *(descargar(session, url) for url in urls),
+            return_exceptions=True,
+        )
+
+    manifest = {}
+    for url, res in zip(urls, resultados):
+        if isinstance(res, Exception):
+            res = {
+                "url": url,
+                "final_url": url,
+                "status": 0,
+                "content_type": "",
+                "size": 0,
+                "outlinks": [],
+                "pdf_links": [],
+                "body": None,
+                "error": repr(res),
+                "fetched_at": time.time(),
+            }
+        manifest[url] = res
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class Manifest:
+    """Vista de solo lectura del manifiesto para las etapas posteriores."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        """Carga el manifiesto, o devuelve None si no existe o está desactivado."""
+        if not USE_MANIFEST or not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __contains__(self, url):
+        return url in self.entries
+
+    def is_pdf(self, url):
+        entry = self.entries.get(url)
+        return entry is not None and "application/pdf" in entry["content_type"]
+
+    def pdf_links(self, url):
+        entry = self.entries.get(url)
+        return entry["pdf_links"] if entry else []
+
+    def html(self, url):
+        """HTML guardado de la URL, o None si no se descargó."""
+        entry = self.entries.get(url)
+        if not entry or not entry.get("body"):
+            return None
+        path = PAGES_DIR / entry["body"]
+        if not path.exists():
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+# Deduplicación de fragmentos casi idénticos antes del embedding
+DEDUP_ENABLED = os.getenv("DEDUP", "0") == "1"
+# Similitud SimHash (1 - distancia de Hamming / 64) a partir de la cual se descarta
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_SHINGLE = int(os.getenv("DEDUP_SHINGLE", "3"))
+
+BITS = 64
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def simhash(text, shingle=DEDUP_SHINGLE):
+    """Firma SimHash de 64 bits sobre shingles de `shingle` palabras."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < shingle:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [
+            " ".join(tokens[i : i + shingle]) for i in range(len(tokens) - shingle + 1)
+        ]
+
+    pesos = [0] * BITS
+    for gram in grams:
+        digest = hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "big")
+        for bit in range(BITS):
+            pesos[bit] += 1 if h >> bit & 1 else -1
+
+    firma = 0
+    for bit in range(BITS):
+        if pesos[bit] > 0:
+            firma |= 1 << bit
+    return firma
+
+
+class NearDupIndex:
+    """Índice persistente de firmas SimHash de los fragmentos ya almacenados.
+
+    Busca candidatos por bandas: con distancia máxima k se parten los 64 bits
+    en k+1 bandas y, por el principio del palomar, dos firmas a distancia <= k
+    coinciden en al menos una banda.
+    """
+
+    def __init__(self, path, threshold=DEDUP_THRESHOLD):
+        self.path = Path(path)
+        self.max_distance = int((1 - threshold) * BITS)
+        n_bands = self.max_distance + 1
+        ancho = BITS // n_bands
+        self.bands = [
+            (i * ancho, BITS if i == n_bands - 1 else (i + 1) * ancho)
+            for i in range(n_bands)
+        ]
+        self.signatures = {}  # firma -> source
+        self.by_source = {}  # source -> set(firmas)
+        self.buckets = {}  # (banda, valor) -> set(firmas)
+        self.checked = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for firma_hex, source in json.load(f):
+                    self._insert(int(firma_hex, 16), source)
+
+    def _keys(self, firma):
+        for i, (ini, fin) in enumerate(self.bands):
+            yield i, (firma >> ini) & ((1 << (fin - ini)) - 1)
+
+    def _insert(self, firma, source):
+        self.signatures[firma] = source
+        self.by_source.setdefault(source, set()).add(firma)
+        for key in self._keys(firma):
+            self.buckets.setdefault(key, set()).add(firma)
+
+    def _is_duplicate(self, firma):
+        for key in self._keys(firma):
+            for otra in self.buckets.get(key, ()):
+                if bin(firma ^ otra).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def filter(self, docs):
+        """Devuelve los fragmentos que no son casi duplicados de otro ya visto
+        y registra sus firmas."""
+        firmas = [simhash(doc.page_content) for doc in docs]
+        kept = []
+        with self._lock:
+            for doc, firma in zip(docs, firmas):
+                self.checked += 1
+                if self._is_duplicate(firma):
+                    self.dropped += 1
+                    continue
+                self._insert(firma, doc.metadata.get("source"))
+                kept.append(doc)
+        return kept
+
+    def remove_source(self, source):
+        """Olvida las firmas de una fuente cuyos fragmentos se van a reemplazar."""
+        with self._lock:
+            for firma in self.by_source.pop(source, ()):
+                del self.signatures[firma]
+                for key in self._keys(firma):
+                    self.buckets[key].discard(firma)
+
+    def save(self):
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with self._lock:
+            data = [[f"{f:016x}", s] for f, s in self.signatures.items()]
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def report(self, dim):
+        return (
+            f"🧹 Dedup: {self.dropped} de {self.checked} fragmentos descartados "
+            f"(= {self.dropped} embeddings ahorrados y {self.dropped} vectores "
+            f"no almacenados, ~{self.dropped * dim * 4 / 1e6:.1f} MB)"
+        )
@@ -0,0 +1,256 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+EMBEDDING_CACHE_DIR = Path(
+    os.getenv(
+        "EMBEDDING_CACHE_DIR",
+        Path(__file__).resolve().parent.parent / "embedding_cache",
+    )
+)
+# Tamaño máximo de los vectores guardados por modelo; al llenarse se expulsan
+# los menos usados recientemente
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def text_key(text):
+    """Hash del texto normalizado (NFC y espacios colapsados)."""
+    normalizado = _SPACES_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.sha1(normalizado.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Caché de vectores en disco: índice SQLite + un array memory-mapped por modelo.
+
+    El índice guarda (modelo, clave) -> slot del array y la fecha de último
+    uso. Cada modelo tiene un fichero de capacidad fija; cuando se llena, los
+    slots de las entradas usadas hace más tiempo se reutilizan (LRU).
+    """
+
+    def __init__(
+        self,
+        directory=EMBEDDING_CACHE_DIR,
+        max_mb=EMBEDDING_CACHE_MAX_MB,
+        dtype=EMBEDDING_CACHE_DTYPE,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.dtype = np.dtype(dtype)
+        self._arrays = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.directory / "index.sqlite", check_same_thread=False, timeout=30
+        )
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY, dim INTEGER, capacity INTEGER, next_slot INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT, key TEXT, slot INTEGER, last_used REAL,
+                PRIMARY KEY (model, key)
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (model, last_used);
+            """)
+
+    @contextmanager
+    def _escritura(self):
+        """Transacción que toma el bloqueo de escritura de SQLite desde el inicio.
+
+        La app y los procesos de ingesta comparten el índice: leer `next_slot`
+        o comprobar el fichero de vectores y después escribir tiene que ser
+        atómico entre procesos para que dos no reclamen el mismo slot.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+    def _array(self, model, dim=None):
+        """Memmap del modelo; lo crea (con la dimensión dada) si no existe.
+
+        Si la dimensión no coincide con la guardada o el fichero no tiene el
+        tamaño que corresponde a `dtype`, la caché del modelo se rehace vacía.
+        Se llama dentro de `_escritura()`.
+        """
+        array = self._arrays.get(model)
+        if array is not None and dim in (None, array.shape[1]):
+            return array
+        fichero = self.directory / (re.sub(r"[^\w.-]", "_", model) + ".bin")
+        row = self._db.execute(
+            "SELECT dim, capacity FROM models WHERE model = ?", (model,)
+        ).fetchone()
+        if row is not None:
+            guardada, capacity = row
+            tamano = capacity * guardada * self.dtype.itemsize
+            if (
+                dim in (None, guardada)
+                and fichero.exists()
+                and fichero.stat().st_size == tamano
+            ):
+                self._arrays[model] = np.memmap(
+                    fichero, dtype=self.dtype, mode="r+", shape=(capacity, guardada)
+                )
+                return self._arrays[model]
+            dim = dim or guardada
+        elif dim is None:
+            return None
+        # Sin un fichero de vectores válido, las entradas del índice no sirven
+        capacity = max(1, self.max_bytes // (dim * self.dtype.itemsize))
+        self._db.execute(
+            "INSERT OR REPLACE INTO models VALUES (?, ?, ?, 0)", (model, dim, capacity)
+        )
+        self._db.execute("DELETE FROM entries WHERE model = ?", (model,))
+        self._arrays[model] = np.memmap(
+            fichero, dtype=self.dtype, mode="w+", shape=(capacity, dim)
+        )
+        return self._arrays[model]
+
+    def _slots(self, model, keys):
+        slots = {}
+        for i in range(0, len(keys), 500):
+            lote = keys[i : i + 500]
+            marcas = ",".join("?" * len(lote))
+            slots.update(
+                self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE model = ? AND key IN ({marcas})",
+                    (model, *lote),
+                ).fetchall()
+            )
+        return slots
+
+    def get_many(self, model, keys):
+        """Devuelve {clave: vector} de las claves presentes y renueva su uso."""
+        if not keys:
+            return {}
+        with self._lock, self._escritura():
+            array = self._array(model)
+            if array is None:
+                return {}
+            slots = self._slots(model, list(dict.fromkeys(keys)))
+            encontrados = {
+                key: np.asarray(array[slot], dtype=np.float32)
+                for key, slot in slots.items()
+            }
+            ahora = time.time()
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE model = ? AND key = ?",
+                [(ahora, model, key) for key in encontrados],
+            )
+            return encontrados
+
+    def put_many(self, model, keys, vectors):
+        if not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._escritura():
+            array = self._array(model, dim=vectors.shape[1])
+            capacity, next_slot = self._db.execute(
+                "SELECT capacity, next_slot FROM models WHERE model = ?", (model,)
+            ).fetchone()
+
+            nuevas = dict(zip(keys, vectors))
+            existentes = self._slots(model, list(nuevas))
+
+            pendientes = [k for k in nuevas if k not in existentes]
+            libres = list(range(next_slot, min(capacity, next_slot + len(pendientes))))
+            faltan = len(pendientes) - len(libres)
+            if faltan > 0:
+                # Expulsar las entradas menos usadas recientemente
+                expulsadas = self._db.execute(
+                    "SELECT key, slot FROM entries WHERE model = ? "
+                    "ORDER BY last_used LIMIT ?",
+                    (model, faltan),
+                ).fetchall()
+                self._db.executemany(
+                    "DELETE FROM entries WHERE model = ? AND key = ?",
+                    [(model, key) for key, _ in expulsadas],
+                )
+                libres.extend(slot for _, slot in expulsadas)
+
+            ahora = time.time()
+            filas = []
+            for key, slot in zip(pendientes, libres):
+                array[slot] = nuevas[key]
+                filas.append((model, key, slot, ahora))
+            self._db.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", filas)
+            self._db.execute(
+                "UPDATE models SET next_slot = ? WHERE model = ?",
+                (min(capacity, next_slot + len(pendientes)), model),
+            )
+            array.flush()
+
+
+class CachedEmbeddings(Embeddings):
+    """Envuelve un modelo de embeddings de LangChain con la caché en disco.
+
+    Solo los textos que no están en caché llegan al modelo, en una única
+    llamada a `embed_documents`. Las consultas se guardan en un espacio de
+    claves aparte por si el modelo las trata distinto que los documentos.
+    """
+
+    def __init__(self, embeddings, model_name, store=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store or EmbeddingStore()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, namespace, texts, embed_fn):
+        keys = [text_key(t) for t in texts]
+        encontrados = self.store.get_many(namespace, keys)
+
+        faltan = {}
+        for key, text in zip(keys, texts):
+            if key not in encontrados and key not in faltan:
+                faltan[key] = text
+        self.hits += len(texts) - len(faltan)
+        self.misses += len(faltan)
+
+        if faltan:
+            vectores = embed_fn(list(faltan.values()))
+            self.store.put_many(namespace, list(faltan), vectores)
+            for key, vector in zip(faltan, vectores):
+                encontrados[key] = vector
+        return [list(map(float, encontrados[k])) for k in keys]
+
+    def embed_documents(self, texts):
+        return self._cached(self.model_name, texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._cached(
+            self.model_name + ":query",
+            [text],
+            lambda ts: [self.embeddings.embed_query(t) for t in ts],
+        )[0]
+
+    def report(self):
+        total = self.hits + self.misses
+        return (
+            f"💾 Caché de embeddings: {self.hits} aciertos de {total} "
+            f"({self.hits / max(total, 1):.0%}), {self.misses} calculados por el modelo"
+        )
+
+
+def cached_embeddings(embeddings, model_name=None):
+    """Devuelve `embeddings` envuelto en la caché si está activada (EMBEDDING_CACHE)."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    return CachedEmbeddings(embeddings, model_name or embeddings.model_name)
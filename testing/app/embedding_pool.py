@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+
+from langchain_core.embeddings import Embeddings
+
+# Procesos de embedding para la ingesta masiva (1 = modelo en el propio proceso)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+# Hilos intra-op por proceso; por defecto se reparten los núcleos entre procesos
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_POOL_BATCH = int(os.getenv("EMBEDDING_POOL_BATCH", "64"))
+
+_model = None
+
+
+def _init_worker(model_name, backend, threads, counter):
+    """Carga una copia del modelo por proceso, limitada a `threads` hilos y
+    fijada (en Linux) a su propio bloque de núcleos."""
+    global _model
+    with counter.get_lock():
+        indice = counter.value
+        counter.value += 1
+
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "ONNX_THREADS"):
+        os.environ[var] = str(threads)
+    if hasattr(os, "sched_setaffinity"):
+        nucleos = os.cpu_count() or 1
+        primero = (indice * threads) % nucleos
+        os.sched_setaffinity(0, {(primero + i) % nucleos for i in range(threads)})
+
+    if backend == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+
+    from embeddings import get_embeddings
+
+    _model = get_embeddings(model_name, backend=backend, cache=False)
+
+
+def _encode(texts):
+    return _model.embed_documents(texts)
+
+
+class EmbeddingPool(Embeddings):
+    """Reparte el embedding entre varios procesos, cada uno con su modelo.
+
+    Los textos se ordenan por longitud antes de formar los lotes, de modo que
+    cada lote se rellena (padding) hasta una longitud parecida, y los
+    resultados se devuelven en el orden original. Requiere el método de
+    arranque "fork": los procesos se crean al construir el pool, antes de que
+    la ingesta lance sus hilos.
+    """
+
+    def __init__(
+        self,
+        model_name,
+        backend,
+        workers=EMBEDDING_WORKERS,
+        threads=EMBEDDING_THREADS,
+        batch_size=EMBEDDING_POOL_BATCH,
+    ):
+        self.model_name = model_name
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.batch_size = batch_size
+        ctx = multiprocessing.get_context("fork")
+        self._pool = ctx.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(model_name, backend, self.threads, ctx.Value("i", 0)),
+        )
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        orden = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        lotes = [
+            orden[i : i + self.batch_size]
+            for i in range(0, len(orden), self.batch_size)
+        ]
+        resultado = [None] * len(texts)
+        vectores = self._pool.imap(_encode, [[texts[j] for j in lote] for lote in lotes])
+        for lote, vectores_lote in zip(lotes, vectores):
+            for idx, vector in zip(lote, vectores_lote):
+                resultado[idx] = vector
+        return resultado
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
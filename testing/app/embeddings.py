@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+
+from embedding_cache import cached_embeddings
+
+# Backend de embeddings: "torch" (HuggingFaceEmbeddings), "onnx" u "onnx-int8"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+
+def get_embeddings(model_name, backend=EMBEDDING_BACKEND, workers=1, cache=True):
+    """Modelo de embeddings de LangChain para `model_name` con el backend elegido.
+
+    Todos los backends exponen embed_documents/embed_query; el resultado se
+    envuelve en la caché de embeddings con una clave por modelo y backend.
+    Con `workers` > 1 el modelo se carga en un pool de procesos (ingesta
+    masiva) y la caché se consulta en el proceso principal.
+    """
+    if backend not in ("torch", "onnx", "onnx-int8"):
+        raise ValueError(f"EMBEDDING_BACKEND desconocido: {backend}")
+    clave = model_name if backend == "torch" else f"{model_name}@{backend}"
+
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("⚠️ El pool de embeddings necesita 'fork'; se usa un solo proceso")
+        workers = 1
+
+    if workers > 1:
+        from embedding_pool import EmbeddingPool
+
+        modelo = EmbeddingPool(model_name, backend, workers=workers)
+    elif backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        modelo = HuggingFaceEmbeddings(
+            model_name=model_name, model_kwargs={"device": "cpu"}
+        )
+    else:
+        from onnx_embeddings import OnnxEmbeddings
+
+        modelo = OnnxEmbeddings(model_name, quantized=backend == "onnx-int8")
+
+    return cached_embeddings(modelo, clave) if cache else modelo
@@ -0,0 +1,55 @@
+"""Traza de tiempos por petición de los nodos del grafo.
+
+Cada nodo envuelto con `traced()` añade a `state["traza"]` su nombre y sus
+instantes de inicio y fin (el canal usa `operator.add` para que las ramas
+paralelas no se pisen). `critical_path()` compara la latencia real de la
+petición con la que tendría el mismo recorrido ejecutado en cadena, un nodo
+detrás de otro, como el grafo lineal anterior.
+"""
+
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+
+def traced(name, func, afunc=None):
+    """Nodo que ejecuta `func` (o `afunc` en async) y registra su duración."""
+
+    def sync(state):
+        inicio = time.perf_counter()
+        salida = func(state)
+        return {**salida, "traza": [(name, inicio, time.perf_counter())]}
+
+    if afunc is None:
+        return RunnableLambda(sync, name=name)
+
+    async def asincrono(state):
+        inicio = time.perf_counter()
+        salida = await afunc(state)
+        return {**salida, "traza": [(name, inicio, time.perf_counter())]}
+
+    return RunnableLambda(sync, afunc=asincrono, name=name)
+
+
+def critical_path(traza):
+    """(segundos reales del primer inicio al último fin, suma de los nodos)."""
+    if not traza:
+        return 0.0, 0.0
+    real = max(fin for _, _, fin in traza) - min(inicio for _, inicio, _ in traza)
+    return real, sum(fin - inicio for _, inicio, fin in traza)
+
+
+def report(traza):
+    if not traza:
+        return "🧭 Traza del grafo: vacía"
+    origen = min(inicio for _, inicio, _ in traza)
+    real, en_cadena = critical_path(traza)
+    lineas = [
+        f"🧭 Traza del grafo: ruta crítica {real * 1000:.0f} ms "
+        f"(en cadena {en_cadena * 1000:.0f} ms, ahorro {(en_cadena - real) * 1000:.0f} ms)"
+    ]
+    for nombre, inicio, fin in sorted(traza, key=lambda t: t[1]):
+        lineas.append(
+            f"   {nombre:<22} {(inicio - origen) * 1000:7.0f} → {(fin - origen) * 1000:7.0f} ms"
+        )
+    return "\n".join(lineas)
@@ -0,0 +1,97 @@
+import os
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+# Etiquetas cuyo contenido no aporta texto útil
+TAGS_IGNORADOS = ["script", "style", "nav", "footer", "header"]
+
+# BeautifulSoup tampoco devuelve en get_text() el texto de <template>, <rt> y
+# <rp> (usa tipos de cadena propios); el extractor lxml los salta igual
+_TAGS_SALTADOS = frozenset(TAGS_IGNORADOS + ["template", "rt", "rp"])
+
+# Extractor usado por extract_text: "lxml" (streaming) o "bs4" (árbol completo)
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml")
+
+
+def extract_text_bs4(html):
+    """Texto visible de un HTML construyendo el árbol completo con BeautifulSoup."""
+    soup = BeautifulSoup(html, "lxml")
+
+    for tag in soup(TAGS_IGNORADOS):
+        tag.decompose()
+
+    text = soup.get_text(separator="\n")
+    lines = [line.strip() for line in text.splitlines()]
+    clean_lines = [line for line in lines if line]
+    return "\n".join(clean_lines)
+
+
+class _TextTarget:
+    """Target de lxml: recibe eventos de parseo sin materializar el árbol.
+
+    Acumula cada nodo de texto entero (lxml puede trocearlo en varias llamadas
+    a `data`) y lo vuelca en líneas limpias al llegar a cualquier frontera de
+    nodo, igual que get_text(separator="\\n") seguido del filtrado de líneas.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self._buffer = []
+        self._skip = 0
+
+    def _flush(self):
+        if self._buffer:
+            for line in "".join(self._buffer).splitlines():
+                line = line.strip()
+                if line:
+                    self.lines.append(line)
+            self._buffer = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        if self._skip or tag in _TAGS_SALTADOS:
+            self._skip += 1
+
+    def end(self, tag):
+        self._flush()
+        if self._skip:
+            self._skip -= 1
+
+    def data(self, data):
+        if not self._skip:
+            self._buffer.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def close(self):
+        self._flush()
+        return "\n".join(self.lines)
+
+
+def extract_text_lxml(html):
+    """Texto visible de un HTML en una sola pasada de eventos lxml.
+
+    Produce la misma salida que `extract_text_bs4`, pero los subárboles de
+    TAGS_IGNORADOS se descartan al vuelo en lugar de construirse y borrarse.
+    """
+    if not html:
+        return ""
+    parser = etree.HTMLParser(target=_TextTarget())
+    parser.feed(html)
+    return parser.close()
+
+
+_EXTRACTORS = {"lxml": extract_text_lxml, "bs4": extract_text_bs4}
+
+
+def extract_text(html):
+    """Texto visible de un HTML con el extractor configurado en HTML_EXTRACTOR.
+
+    Función pura a nivel de módulo para poder ejecutarse en un pool de procesos.
+    """
+    return _EXTRACTORS[HTML_EXTRACTOR](html)
@@ -0,0 +1,228 @@
+"""Perfiles del índice vectorial de Milvus y parámetros de búsqueda.
+
+Cada perfil fija el tipo de índice y sus parámetros de construcción, y el
+parámetro de búsqueda que intercambia recall por latencia (`nprobe` en los
+IVF, `ef` en HNSW):
+
+- ivf_flat: vectores completos en 128 listas; el perfil original.
+- ivf_sq8: igual que ivf_flat pero con vectores cuantizados a 8 bits
+  (unas 4 veces menos memoria, algo menos de recall).
+- hnsw: grafo navegable; la menor latencia a igual recall, más memoria.
+
+`0_create_collection.py` crea la colección `<nombre>__<perfil>` con
+INDEX_PROFILE y el alias `<nombre>`, que es el que usan la app y la
+ingesta. Para cambiar de perfil sin reingerir ni cortar las búsquedas:
+`python index_profiles.py <nombre> <perfil>` (véase `rebuild`).
+"""
+
+import os
+import sys
+import threading
+import time
+
+from retrieval_cache import collection_version, mark_collection_changed
+
+METRIC_TYPE = "L2"
+PROFILES = {
+    "ivf_flat": {
+        "index_type": "IVF_FLAT",
+        "params": {"nlist": 128},
+        "search_param": "nprobe",
+    },
+    "ivf_sq8": {
+        "index_type": "IVF_SQ8",
+        "params": {"nlist": 128},
+        "search_param": "nprobe",
+    },
+    "hnsw": {
+        "index_type": "HNSW",
+        "params": {"M": 16, "efConstruction": 200},
+        "search_param": "ef",
+    },
+}
+INDEX_PROFILE = os.getenv("INDEX_PROFILE", "ivf_flat")
+# Parámetros de búsqueda: más alto, más recall y más latencia
+SEARCH_NPROBE = int(os.getenv("SEARCH_NPROBE", "10"))
+SEARCH_EF = int(os.getenv("SEARCH_EF", "64"))
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def index_params(profile=INDEX_PROFILE):
+    """Parámetros de `create_index` del perfil."""
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Perfil de índice desconocido: {profile} (perfiles: {', '.join(PROFILES)})"
+        )
+    perfil = PROFILES[profile]
+    return {
+        "metric_type": METRIC_TYPE,
+        "index_type": perfil["index_type"],
+        "params": perfil["params"],
+    }
+
+
+def profile_of(index_type):
+    """Nombre del perfil de un tipo de índice de Milvus, o None."""
+    for nombre, perfil in PROFILES.items():
+        if perfil["index_type"] == index_type:
+            return nombre
+    return None
+
+
+def search_params(index_type, nprobe=SEARCH_NPROBE, ef=SEARCH_EF):
+    """Parámetros de búsqueda (`param` de Milvus) para un tipo de índice."""
+    perfil = PROFILES.get(profile_of(index_type), {})
+    valores = {"nprobe": nprobe, "ef": ef}
+    params = {}
+    if "search_param" in perfil:
+        params[perfil["search_param"]] = valores[perfil["search_param"]]
+    return {"metric_type": METRIC_TYPE, "params": params}
+
+
+def collection_index_type(col):
+    """Tipo del índice vectorial de una colección de pymilvus, o None."""
+    for indice in col.indexes:
+        if "index_type" in indice.params:
+            return indice.params["index_type"]
+    return None
+
+
+def vectorstore_search_params(vectorstore, **overrides):
+    """Parámetros de búsqueda para el índice actual del vectorstore.
+
+    El tipo de índice se consulta a Milvus una vez por versión de la
+    colección, de modo que tras un cambio de perfil la app pasa sola a los
+    parámetros del índice nuevo. `overrides` (nprobe, ef) sustituye a los de
+    SEARCH_NPROBE y SEARCH_EF en esta búsqueda.
+    """
+    if vectorstore.col is None:
+        return None
+    clave = vectorstore.collection_name
+    version = collection_version(clave)
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada is None or entrada[0] != version:
+            entrada = (version, collection_index_type(vectorstore.col))
+            _cache[clave] = entrada
+    return search_params(entrada[1], **overrides)
+
+
+def physical_collection(name):
+    """Colección real de Milvus detrás de `name` (alias o colección), o None."""
+    from pymilvus import utility
+
+    for real in utility.list_collections():
+        if real == name or name in utility.list_aliases(real):
+            return real
+    return None
+
+
+def shadow_name(alias, profile):
+    """Nombre de la colección real de `alias` con el índice de `profile`."""
+    from pymilvus import utility
+
+    nombre = f"{alias}__{profile}"
+    if utility.has_collection(nombre):
+        nombre = f"{nombre}_{int(time.time())}"
+    return nombre
+
+
+def _copy_rows(origen, destino, batch_size=1000):
+    """Copia todas las filas de `origen` a `destino` salvo la clave primaria
+    (auto_id: Milvus asigna claves nuevas). Devuelve cuántas copió."""
+    pk = origen.schema.primary_field.name
+    campos = [f.name for f in origen.schema.fields if f.name != pk]
+    iterador = origen.query_iterator(
+        batch_size=batch_size, expr="", output_fields=campos
+    )
+    copiadas = 0
+    while lote := iterador.next():
+        destino.insert([{c: fila[c] for c in campos} for fila in lote])
+        copiadas += len(lote)
+    iterador.close()
+    destino.flush()
+    return copiadas
+
+
+def rebuild(collection, profile):
+    """Cambia el índice vectorial de `collection` al del perfil sin cortar
+    las búsquedas.
+
+    Copia las filas a una colección sombra con el mismo esquema, construye
+    allí el índice nuevo, la carga y mueve a ella el alias `collection` con
+    `utility.alter_alias`, un cambio atómico: la app sigue buscando en la
+    colección anterior hasta ese momento. Después borra la colección
+    anterior y reconstruye el índice BM25, porque las claves primarias
+    cambian con la copia.
+
+    No se debe ingerir durante la reconstrucción: lo insertado en la
+    colección anterior después de copiarla se perdería. Si el número de
+    filas cambia antes del cambio de alias, se aborta y se borra la sombra.
+    Una colección creada antes de usar alias (sin `0_create_collection.py`
+    actual) se convierte en alias: se borra y el alias se crea justo
+    después, y en ese instante la app responde solo con BM25.
+    """
+    from pymilvus import Collection, connections, utility
+
+    from bm25_index import _chunks_from_milvus, build_index
+
+    connections.connect(
+        host=os.getenv("MILVUS_HOST", "localhost"),
+        port=os.getenv("MILVUS_PORT", "19530"),
+    )
+    params = index_params(profile)
+    real = physical_collection(collection)
+    if real is None:
+        raise ValueError(f"No existe la colección ni el alias: {collection}")
+    anterior = Collection(real)
+    sombra_nombre = shadow_name(collection, profile)
+    print(
+        f"🔧 {collection} ({real}): {collection_index_type(anterior)} → "
+        f"{params['index_type']} en {sombra_nombre}"
+    )
+    inicio = time.perf_counter()
+
+    anterior.flush()
+    filas = anterior.num_entities
+    opciones = {}
+    if any(f.is_partition_key for f in anterior.schema.fields):
+        opciones["num_partitions"] = len(anterior.partitions)
+    sombra = Collection(sombra_nombre, schema=anterior.schema, **opciones)
+    copiadas = _copy_rows(anterior, sombra)
+    sombra.create_index(field_name="vector", index_params=params)
+    utility.wait_for_index_building_complete(sombra_nombre)
+    sombra.load()
+
+    anterior.flush()
+    if anterior.num_entities != filas or copiadas != filas:
+        sombra.drop()
+        raise RuntimeError(
+            f"{real} cambió durante la reconstrucción ({filas} filas, "
+            f"{anterior.num_entities} ahora, {copiadas} copiadas): "
+            "no se debe ingerir a la vez; se deja el índice anterior"
+        )
+
+    if real != collection:
+        utility.alter_alias(sombra_nombre, collection)
+        anterior.drop()
+    else:
+        print(f"⚠️ {collection} no es un alias: se sustituye por uno")
+        anterior.drop()
+        utility.create_alias(sombra_nombre, collection)
+    mark_collection_changed(collection)
+    print(
+        f"✅ Índice {params['index_type']} construido y alias {collection} → "
+        f"{sombra_nombre} en {time.perf_counter() - inicio:.1f}s"
+    )
+
+    total = build_index(collection, _chunks_from_milvus(collection))
+    print(f"🔤 Índice BM25 de {collection} reconstruido: {total} fragmentos")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[2] not in PROFILES:
+        print(f"Uso: python index_profiles.py <colección> <{'|'.join(PROFILES)}>")
+        sys.exit(1)
+    rebuild(sys.argv[1], sys.argv[2])
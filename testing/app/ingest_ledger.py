@@ -0,0 +1,272 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from bm25_index import record_delete
+from retrieval_cache import mark_collection_changed
+
+
+def content_hash(data):
+    """SHA-256 del contenido de una fuente (texto extraído o bytes del fichero)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 de un fichero leído por bloques, sin cargarlo entero en memoria."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(chunk_size), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def source_expr(source):
+    """Expresión de filtro de Milvus para los fragmentos de una fuente."""
+    escaped = source.replace("\\", "\\\\").replace('"', '\\"')
+    return f'source == "{escaped}"'
+
+
+def delete_source(vectorstore, source):
+    """Borra de Milvus todos los fragmentos cuyo metadato `source` coincide."""
+    if vectorstore.col is None:
+        return
+    vectorstore.delete(expr=source_expr(source))
+    record_delete(vectorstore.collection_name, source)
+    mark_collection_changed(vectorstore.collection_name)
+
+
+# Estados de una fuente, en orden. "inserted" es el único estado final.
+STATES = ("fetched", "extracted", "chunked", "embedded", "inserted")
+# Segundos mínimos entre guardados intermedios del ledger
+LEDGER_SAVE_INTERVAL = float(os.getenv("LEDGER_SAVE_INTERVAL", "5"))
+
+
+class IngestLedger:
+    """Registro en disco del estado de cada fuente de la ingesta.
+
+    Cada fuente avanza por STATES y guarda el hash de su contenido, el número
+    de fragmentos y, al terminar, los IDs de Milvus de sus fragmentos. Las
+    fuentes "inserted" con el mismo hash se omiten; las que quedaron a medias
+    se deshacen con `rollback()` y se retoman desde el texto extraído, que se
+    guarda comprimido junto al ledger hasta que la fuente termina. El bloque
+    "job" del fichero resume el progreso de la ejecución en curso (véase
+    `python ingest_ledger.py <ledger>`); si se interrumpe, la siguiente
+    ejecución la retoma en lugar de empezar otra.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.checkpoints = self.path.with_name(self.path.stem + "_checkpoints")
+        self.entries = {}
+        self.job = {}
+        self._lock = threading.RLock()
+        self._saved_at = 0.0
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if "sources" in data:
+                self.entries = data["sources"]
+                self.job = data.get("job", {})
+            else:
+                # Formato anterior: source -> {hash, chunks}, todo insertado
+                self.entries = {
+                    source: {**entry, "state": "inserted"}
+                    for source, entry in data.items()
+                }
+
+    def start(self, sources, restart=False):
+        """Empieza una ejecución sobre `sources` (para progreso y ETA).
+
+        Si la ejecución anterior quedó sin terminar (sin `finish()`) y no se
+        pide `restart`, se retoma: conserva su inicio y su progreso, y las
+        fuentes que ya completó se omiten sin descargarlas (`done_in_job`).
+        Devuelve True si se retoma.
+        """
+        ahora = time.time()
+        with self._lock:
+            retomar = bool(self.job) and not restart and not self._finished()
+            if retomar:
+                hechas = sum(1 for source in sources if self.done_in_job(source))
+                self.job.update(
+                    total=len(sources),
+                    done=hechas,
+                    resumed_at=ahora,
+                    resumed_done=hechas,
+                    updated_at=ahora,
+                )
+            else:
+                self.job = {
+                    "total": len(sources),
+                    "done": 0,
+                    "started_at": ahora,
+                    "updated_at": ahora,
+                    "finished": False,
+                }
+            self.save()
+            return retomar
+
+    def _finished(self):
+        # Los ledgers anteriores a "finished" se dan por terminados si llegaron al total
+        return self.job.get(
+            "finished", self.job.get("done", 0) >= self.job.get("total", 0)
+        )
+
+    def finish(self):
+        """Da por terminada la ejecución: la siguiente empieza desde cero."""
+        with self._lock:
+            if self.job:
+                self.job.update(finished=True, updated_at=time.time())
+            self.save()
+
+    def done_in_job(self, source):
+        """Si `source` ya se insertó o se comprobó sin cambios en la ejecución
+        en curso (se omite al retomarla, sin descargar ni extraer nada)."""
+        entry = self.entries.get(source)
+        if not self.job or entry is None or entry["state"] != "inserted":
+            return False
+        visto = max(entry["updated_at"], entry.get("checked_at", 0))
+        return visto >= self.job["started_at"]
+
+    def state(self, source):
+        entry = self.entries.get(source)
+        return entry["state"] if entry else None
+
+    def unchanged(self, source, digest):
+        entry = self.entries.get(source)
+        return (
+            entry is not None
+            and entry["state"] == "inserted"
+            and entry["hash"] == digest
+        )
+
+    def mark(self, source, state, **fields):
+        """Avanza `source` a `state` con los campos dados (hash, chunks, ids)."""
+        with self._lock:
+            ahora = time.time()
+            entry = self.entries.setdefault(source, {})
+            entry.update(fields, state=state, updated_at=ahora)
+            if state == "inserted":
+                self._checkpoint_path(source).unlink(missing_ok=True)
+                self._done(ahora)
+            self.checkpoint()
+
+    def callbacks(self, source):
+        """on_embedded/on_done para `BatchInserter.add` que avanzan `source`."""
+        return {
+            "on_embedded": lambda: self.mark(source, "embedded"),
+            "on_done": lambda ids: self.mark(source, "inserted", ids=ids),
+        }
+
+    def skip(self, source):
+        """Cuenta una fuente sin cambios como hecha en la ejecución actual."""
+        with self._lock:
+            ahora = time.time()
+            entry = self.entries.get(source)
+            if entry is not None:
+                entry["checked_at"] = ahora
+            self._done(ahora)
+            self.checkpoint()
+
+    def _done(self, ahora):
+        if self.job:
+            self.job["done"] += 1
+            self.job["updated_at"] = ahora
+
+    def _checkpoint_path(self, source):
+        nombre = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        return self.checkpoints / f"{nombre}.txt.gz"
+
+    def save_text(self, source, digest, text):
+        """Guarda el texto extraído y marca la fuente como "extracted"."""
+        self.checkpoints.mkdir(parents=True, exist_ok=True)
+        destino = self._checkpoint_path(source)
+        tmp = destino.with_suffix(".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, destino)
+        self.mark(source, "extracted", hash=digest)
+
+    def load_text(self, source, digest=None):
+        """Texto ya extraído de una fuente a medias, o None si hay que extraerlo.
+
+        Con `digest` solo se reutiliza si el contenido de origen no ha cambiado.
+        """
+        entry = self.entries.get(source)
+        if entry is None or entry["state"] in ("fetched", "inserted"):
+            return None
+        if digest is not None and entry.get("hash") != digest:
+            return None
+        fichero = self._checkpoint_path(source)
+        if not fichero.exists():
+            return None
+        with gzip.open(fichero, "rt", encoding="utf-8") as f:
+            return f.read()
+
+    def rollback(self, vectorstore):
+        """Borra de Milvus las fuentes que quedaron a medias en una ejecución
+        anterior y las devuelve a "extracted". Devuelve cuántas se deshicieron."""
+        deshechas = 0
+        for source, entry in self.entries.items():
+            if entry["state"] not in ("chunked", "embedded"):
+                continue
+            delete_source(vectorstore, source)
+            entry.pop("ids", None)
+            entry.update(state="extracted", updated_at=time.time())
+            deshechas += 1
+        if deshechas:
+            self.save()
+        return deshechas
+
+    def counts(self):
+        contadores = dict.fromkeys(STATES, 0)
+        for entry in self.entries.values():
+            contadores[entry["state"]] += 1
+        return contadores
+
+    def progress(self):
+        if not self.job:
+            return "📈 Sin ejecución registrada"
+        total, hechas = self.job["total"], self.job["done"]
+        # El ritmo se mide desde la última reanudación, sin contar la pausa
+        inicio = self.job.get("resumed_at", self.job["started_at"])
+        transcurrido = self.job["updated_at"] - inicio
+        tramo = hechas - self.job.get("resumed_done", 0)
+        ritmo = tramo / transcurrido if transcurrido > 0 else 0.0
+        eta = f"{(total - hechas) / ritmo / 60:.1f} min" if ritmo else "?"
+        estados = ", ".join(f"{k} {v}" for k, v in self.counts().items() if v)
+        return (
+            f"📈 {hechas}/{total} fuentes ({hechas / max(total, 1):.0%}), "
+            f"{ritmo * 60:.1f} fuentes/min, ETA {eta} | {estados}"
+        )
+
+    def checkpoint(self):
+        """Guarda el ledger si han pasado LEDGER_SAVE_INTERVAL segundos."""
+        if time.time() - self._saved_at >= LEDGER_SAVE_INTERVAL:
+            self.save()
+            print(self.progress())
+
+    def save(self):
+        with self._lock:
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"job": self.job, "sources": self.entries},
+                    f,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp, self.path)
+            self._saved_at = time.time()
+
+
+if __name__ == "__main__":
+    # Progreso de una ingesta en curso: python ingest_ledger.py ../ledger_html.json
+    for ruta in sys.argv[1:]:
+        print(f"{ruta}: {IngestLedger(ruta).progress()}")
@@ -0,0 +1,170 @@
+"""Backend de embeddings con ONNX Runtime para modelos sentence-transformers.
+
+Exporta el transformer del modelo a ONNX (y opcionalmente lo cuantiza a int8
+de forma dinámica) y replica en numpy el pooling y la normalización del
+modelo original. En ejecución solo necesita onnxruntime, tokenizers y numpy.
+
+    python onnx_embeddings.py sentence-transformers/all-MiniLM-L6-v2 [...]
+"""
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_DIR = Path(
+    os.getenv("ONNX_DIR", Path(__file__).resolve().parent.parent / "onnx_models")
+)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = lo decide ONNX Runtime
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "32"))
+
+
+def model_dir(model_name):
+    return ONNX_DIR / re.sub(r"[^\w.-]", "_", model_name)
+
+
+def export_onnx(model_name, quantize=True):
+    """Exporta `model_name` a ONNX en ONNX_DIR y devuelve su directorio.
+
+    Guarda model.onnx (fp32), model_int8.onnx si `quantize`, tokenizer.json y
+    config.json con la longitud máxima, el pooling y la normalización.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    destino = model_dir(model_name)
+    destino.mkdir(parents=True, exist_ok=True)
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    pooling = next(m for m in st if isinstance(m, Pooling))
+    if pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"Pooling no soportado: {pooling.get_pooling_mode_str()}")
+
+    ejemplo = st.tokenizer(["Renovación de la tarjeta NIE"], return_tensors="pt")
+    inputs = [
+        k for k in ("input_ids", "attention_mask", "token_type_ids") if k in ejemplo
+    ]
+    ejes = {k: {0: "batch", 1: "seq"} for k in inputs}
+    ejes["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            ({k: ejemplo[k] for k in inputs},),
+            str(destino / "model.onnx"),
+            input_names=inputs,
+            output_names=["last_hidden_state"],
+            dynamic_axes=ejes,
+            opset_version=14,
+            dynamo=False,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            str(destino / "model.onnx"),
+            str(destino / "model_int8.onnx"),
+            weight_type=QuantType.QInt8,
+        )
+
+    st.tokenizer.save_pretrained(str(destino))
+    with open(destino / "config.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "model_name": model_name,
+                "inputs": inputs,
+                "max_seq_length": st.max_seq_length,
+                "pad_token": st.tokenizer.pad_token,
+                "pad_token_id": st.tokenizer.pad_token_id,
+                "normalize": any(isinstance(m, Normalize) for m in st),
+            },
+            f,
+            indent=2,
+        )
+    return destino
+
+
+class OnnxEmbeddings(Embeddings):
+    """Misma interfaz que HuggingFaceEmbeddings, ejecutada con ONNX Runtime.
+
+    Si el modelo no está exportado en ONNX_DIR se exporta la primera vez.
+    Los textos se agrupan por longitud para minimizar el padding de cada lote.
+    """
+
+    def __init__(self, model_name, quantized=False, batch_size=ONNX_BATCH_SIZE):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        directorio = model_dir(model_name)
+        fichero = directorio / ("model_int8.onnx" if quantized else "model.onnx")
+        if not fichero.exists():
+            print(f"📦 Exportando {model_name} a ONNX en {directorio}")
+            export_onnx(model_name, quantize=quantized)
+
+        with open(directorio / "config.json", "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(str(directorio / "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(
+            pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"]
+        )
+
+        opciones = ort.SessionOptions()
+        if ONNX_THREADS:
+            opciones.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(
+            str(fichero), opciones, providers=["CPUExecutionProvider"]
+        )
+
+    def _encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        columnas = {
+            "input_ids": [e.ids for e in encodings],
+            "attention_mask": [e.attention_mask for e in encodings],
+            "token_type_ids": [e.type_ids for e in encodings],
+        }
+        feeds = {
+            k: np.asarray(columnas[k], dtype=np.int64) for k in self.config["inputs"]
+        }
+        (hidden,) = self.session.run(["last_hidden_state"], feeds)
+
+        # Mean pooling sobre los tokens reales
+        mask = feeds["attention_mask"][..., None].astype(np.float32)
+        vectores = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+            vectores = vectores / np.clip(normas, 1e-12, None)
+        return vectores
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        orden = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        resultado = [None] * len(texts)
+        for i in range(0, len(orden), self.batch_size):
+            lote = orden[i : i + self.batch_size]
+            for idx, vector in zip(lote, self._encode([texts[j] for j in lote])):
+                resultado[idx] = vector.tolist()
+        return resultado
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+if __name__ == "__main__":
+    modelos = sys.argv[1:] or [
+        "sentence-transformers/all-MiniLM-L6-v2",
+        "sentence-transformers/all-mpnet-base-v2",
+    ]
+    for nombre in modelos:
+        print(f"✅ {nombre} exportado en {export_onnx(nombre)}")
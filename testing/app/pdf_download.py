@@ -0,0 +1,104 @@
+import json
+import os
+from email.utils import formatdate
+from pathlib import Path
+
+import requests
+
+CHUNK_SIZE = 1 << 20
+
+_session = requests.Session()
+_session.verify = False
+
+
+class DownloadValidators:
+    """Validadores HTTP (ETag / Last-Modified) de cada PDF descargado, en disco.
+
+    Guarda también los de las descargas parciales para reanudarlas con
+    `If-Range` sin mezclar bytes de versiones distintas del fichero.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, url):
+        return self.entries.get(url, {})
+
+    def set(self, url, **values):
+        self.entries[url] = {**self.entries.get(url, {}), **values}
+
+    def save(self):
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def _validator_headers(resp):
+    return {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def download_pdf(url, path, validators, timeout=15):
+    """Descarga un PDF en streaming con escritura atómica.
+
+    - Si el fichero ya existe, hace un GET condicional (If-None-Match /
+      If-Modified-Since) y un 304 evita la transferencia.
+    - Si quedó un `.part` de una descarga interrumpida, la reanuda con Range
+      e If-Range; si el servidor no acepta el rango, empieza de cero.
+    - El cuerpo se escribe por bloques en el `.part`, que se renombra al final,
+      así que la memoria usada no depende del tamaño del PDF.
+
+    Devuelve "descargado", "sin_cambios" o None si falla.
+    """
+    path = Path(path)
+    part = path.with_name(path.name + ".part")
+    previos = validators.get(url)
+    headers = {}
+
+    if part.exists() and previos.get("partial"):
+        offset = part.stat().st_size
+        validador = previos["partial"].get("etag") or previos["partial"].get(
+            "last_modified"
+        )
+        if validador:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validador
+    elif path.exists():
+        if previos.get("etag"):
+            headers["If-None-Match"] = previos["etag"]
+        headers["If-Modified-Since"] = previos.get("last_modified") or formatdate(
+            path.stat().st_mtime, usegmt=True
+        )
+
+    try:
+        with _session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            if r.status_code == 304:
+                return "sin_cambios"
+            if r.status_code == 416:
+                # Rango inválido: el .part no corresponde al recurso actual
+                part.unlink(missing_ok=True)
+                return None
+            if r.status_code not in (200, 206):
+                return None
+
+            modo = "ab" if r.status_code == 206 else "wb"
+            validators.set(url, partial=_validator_headers(r))
+            validators.save()
+            with open(part, modo) as f:
+                for bloque in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(bloque)
+
+        os.replace(part, path)
+        validators.set(url, partial=None, **_validator_headers(r))
+        validators.save()
+        return "descargado"
+    except (requests.RequestException, OSError) as e:
+        print(f"⚠️ Descarga interrumpida ({e}); se reanudará en la próxima ejecución")
+        return None
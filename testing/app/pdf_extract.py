@@ -0,0 +1,111 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pdfplumber
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+PDF_PAGES_PER_SHARD = int(os.getenv("PDF_PAGES_PER_SHARD", "8"))
+
+
+def count_pages(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pages(pdf_path, start, end):
+    """Extrae el texto de las páginas [start, end) de un PDF.
+
+    Se ejecuta en un proceso del pool. Un fallo en una página deja su texto
+    vacío y se anota, sin afectar al resto. Devuelve (textos, páginas
+    fallidas, segundos de CPU).
+    """
+    inicio = time.process_time()
+    textos = []
+    fallidas = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for i in range(start, end):
+            try:
+                textos.append(pdf.pages[i].extract_text() or "")
+            except Exception:
+                textos.append("")
+                fallidas.append(i)
+    return textos, fallidas, time.process_time() - inicio
+
+
+def extract_pdfs(paths, workers=PDF_WORKERS, pages_per_shard=PDF_PAGES_PER_SHARD):
+    """Extrae varios PDFs a la vez repartiendo rangos de páginas en un pool.
+
+    Produce (path, texto, stats) según va completando cada documento, con las
+    páginas en su orden original. `stats` incluye páginas, páginas fallidas,
+    segundos de apertura, segundos de extracción (pared) y CPU acumulada.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        docs = {}
+        futures = {}
+        for path in paths:
+            inicio = time.perf_counter()
+            try:
+                n_pages = count_pages(path)
+            except Exception as e:
+                print(f"❌ No se pudo abrir {path}: {e}")
+                yield path, "", {"pages": 0, "failed": [], "error": str(e)}
+                continue
+            if n_pages == 0:
+                yield path, "", {"pages": 0, "failed": []}
+                continue
+            shards = list(range(0, n_pages, pages_per_shard))
+            docs[path] = {
+                "started": inicio,
+                "open_s": time.perf_counter() - inicio,
+                "pages": n_pages,
+                "parts": [None] * len(shards),
+                "remaining": len(shards),
+                "failed": [],
+                "cpu_s": 0.0,
+            }
+            for idx, start in enumerate(shards):
+                end = min(start + pages_per_shard, n_pages)
+                fut = pool.submit(extract_pages, path, start, end)
+                futures[fut] = (path, idx, start, end)
+
+        for fut in as_completed(futures):
+            path, idx, start, end = futures[fut]
+            doc = docs[path]
+            try:
+                textos, fallidas, cpu = fut.result()
+            except Exception:
+                # El shard entero falló (p. ej. el proceso murió): páginas vacías
+                textos, fallidas, cpu = (
+                    [""] * (end - start),
+                    list(range(start, end)),
+                    0.0,
+                )
+            doc["parts"][idx] = textos
+            doc["failed"].extend(fallidas)
+            doc["cpu_s"] += cpu
+            doc["remaining"] -= 1
+
+            if doc["remaining"] == 0:
+                del docs[path]
+                texto = "\n".join(t for parte in doc["parts"] for t in parte)
+                stats = {
+                    "pages": doc["pages"],
+                    "failed": sorted(doc["failed"]),
+                    "open_s": doc["open_s"],
+                    "extract_s": time.perf_counter() - doc["started"] - doc["open_s"],
+                    "cpu_s": doc["cpu_s"],
+                }
+                yield path, texto, stats
+
+
+def format_stats(stats):
+    if "extract_s" not in stats:
+        return f"{stats['pages']} páginas"
+    linea = (
+        f"{stats['pages']} páginas: apertura {stats['open_s']:.2f}s, "
+        f"extracción {stats['extract_s']:.2f}s (pared), CPU {stats['cpu_s']:.2f}s"
+    )
+    if stats["failed"]:
+        linea += f", {len(stats['failed'])} páginas fallidas {stats['failed'][:10]}"
+    return linea
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+
+_FIN = object()
+
+
+class Stage:
+    """Etapa de un pipeline: `workers` hilos que leen de una cola acotada.
+
+    `fn` recibe un elemento (o una lista de hasta `batch_size` elementos si
+    `batch_size > 1`) y devuelve un iterable con las salidas para la etapa
+    siguiente; devolver un iterable vacío filtra el elemento.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=64, batch_size=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.errors = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+        self._alive = workers
+
+    def _next_batch(self):
+        """Bloquea hasta el primer elemento y completa el lote con lo que ya
+        esté en cola, sin esperar a que se llene."""
+        item = self.queue.get()
+        if item is _FIN or self.batch_size == 1:
+            return item
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _FIN:
+                # Devolver el fin a la cola para el resto de hilos
+                self.queue.put(_FIN)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self, downstream):
+        while True:
+            item = self._next_batch()
+            if item is _FIN:
+                break
+            inicio = time.perf_counter()
+            try:
+                for out in self.fn(item) or ():
+                    if downstream is not None:
+                        downstream.queue.put(out)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ [{self.name}] {e!r}")
+            with self._lock:
+                self.busy += time.perf_counter() - inicio
+                self.processed += len(item) if self.batch_size > 1 else 1
+
+        with self._lock:
+            self._alive -= 1
+            ultimo = self._alive == 0
+        if ultimo and downstream is not None:
+            for _ in range(downstream.workers):
+                downstream.queue.put(_FIN)
+
+    def status(self, elapsed):
+        return (
+            f"{self.name}: cola {self.queue.qsize()}/{self.queue.maxsize}, "
+            f"{self.processed} procesados ({self.processed / max(elapsed, 1e-9):.1f}/s), "
+            f"ocupación {self.busy / max(elapsed * self.workers, 1e-9):.0%}"
+            + (f", {self.errors} errores" if self.errors else "")
+        )
+
+
+class Pipeline:
+    """Encadena etapas con colas acotadas para solapar red, CPU y embedding.
+
+    Las colas acotadas aplican contrapresión: una etapa lenta frena a las
+    anteriores y la memoria se mantiene plana sea cual sea el tamaño de la
+    entrada.
+    """
+
+    def __init__(self, stages, report_every=5.0):
+        self.stages = stages
+        self.report_every = report_every
+
+    def report(self, elapsed):
+        return "\n".join(f"   {s.status(elapsed)}" for s in self.stages)
+
+    def run(self, items):
+        inicio = time.perf_counter()
+        threads = []
+        for i, stage in enumerate(self.stages):
+            downstream = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            for _ in range(stage.workers):
+                t = threading.Thread(target=stage._run, args=(downstream,), daemon=True)
+                t.start()
+                threads.append(t)
+
+        terminado = threading.Event()
+
+        def monitor():
+            while not terminado.wait(self.report_every):
+                print(f"📈 Pipeline ({time.perf_counter() - inicio:.0f}s)")
+                print(self.report(time.perf_counter() - inicio))
+
+        threading.Thread(target=monitor, daemon=True).start()
+
+        primera = self.stages[0]
+        for item in items:
+            primera.queue.put(item)
+        for _ in range(primera.workers):
+            primera.queue.put(_FIN)
+
+        for t in threads:
+            t.join()
+        terminado.set()
+        return time.perf_counter() - inicio
@@ -0,0 +1,66 @@
+import os
+
+from topics import mentions, term_pattern
+
+# Candidatos recuperados antes de conocer la intención y los que quedan tras
+# reordenarlos
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "8"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+# Búsqueda híbrida: densa (Milvus) y léxica (BM25) fusionadas por RRF
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") != "0"
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Mismo formato que topics.TERMINOS_TEMA: "*" marca una raíz
+TERMINOS_UE = (
+    "unión europea",
+    "comunitari*",
+    "ciudadanos de la unión",
+    "certificado de registro",
+)
+_PATRON_UE = term_pattern(TERMINOS_UE)
+# Peso de cada señal frente a la posición original (1.0 = el primero)
+PESO_INTENCION = 0.5
+PESO_UE = 0.5
+
+
+def reciprocal_rank_fusion(listas, k=RRF_K, top_k=None):
+    """Fusiona rankings de documentos sumando 1 / (k + posición) en cada uno.
+
+    Los documentos se identifican por su texto, que es el mismo venga de
+    Milvus o del índice BM25. Con empate gana el que antes apareció.
+    """
+    puntuaciones = {}
+    documentos = {}
+    for lista in listas:
+        for posicion, doc in enumerate(lista, start=1):
+            clave = doc.page_content
+            documentos.setdefault(clave, doc)
+            puntuaciones[clave] = puntuaciones.get(clave, 0.0) + 1 / (k + posicion)
+    orden = sorted(puntuaciones, key=puntuaciones.get, reverse=True)
+    return [documentos[clave] for clave in orden[:top_k]]
+
+
+def rerank(docs, intencion, ciudadano_ue=False, top_k=RETRIEVAL_TOP_K):
+    """Reordena los candidatos de la búsqueda vectorial con la intención y la
+    nota de ciudadanía UE, que se conocen después de lanzar la búsqueda.
+
+    La posición original sigue siendo la señal principal; cada fragmento suma
+    PESO_INTENCION si menciona la intención y, para ciudadanos de la UE,
+    PESO_UE si trata el régimen comunitario o lo resta si habla de asilo sin
+    que se haya preguntado por él.
+    """
+    n = len(docs)
+    puntuados = []
+    for posicion, doc in enumerate(docs):
+        texto = doc.page_content.lower()
+        puntuacion = (n - posicion) / n
+        if mentions(texto, intencion):
+            puntuacion += PESO_INTENCION
+        if ciudadano_ue:
+            if _PATRON_UE.search(texto):
+                puntuacion += PESO_UE
+            elif intencion != "asilo" and mentions(texto, "asilo"):
+                puntuacion -= PESO_UE
+        puntuados.append((-puntuacion, posicion, doc))
+    puntuados.sort(key=lambda t: t[:2])
+    return [doc for _, _, doc in puntuados[:top_k]]
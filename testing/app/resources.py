@@ -0,0 +1,151 @@
+"""Recursos pesados compartidos por todo el proceso de la app.
+
+Streamlit vuelve a ejecutar app.py en cada interacción y en cada sesión,
+pero los módulos importados se conservan: los objetos creados aquí (LLM,
+modelo de embeddings, conexión a Milvus, cachés y grafo compilado) se
+construyen una sola vez por proceso, la primera vez que se piden, y después
+se reutilizan. La conexión a Milvus se comprueba periódicamente y se
+reconecta sin reconstruir el vectorstore.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from startup import step
+
+FAKE_LLM_RESPONSE = (
+    "Respuesta de prueba: para renovar el NIE solicite cita previa y presente "
+    "el formulario EX-17 con su pasaporte y la tarjeta actual."
+)
+# Segundos entre comprobaciones de la conexión a Milvus
+MILVUS_HEALTH_INTERVAL = float(os.getenv("MILVUS_HEALTH_INTERVAL", "30"))
+
+_instances = {}
+_locks = {}
+_locks_lock = threading.Lock()
+_checked_at = {}
+
+
+def singleton(key, factory):
+    """Instancia única por proceso para `key`, creada con `factory()` al pedirla
+    por primera vez. Si `factory` falla no se guarda nada y se reintenta."""
+    if key in _instances:
+        return _instances[key]
+    with _locks_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _instances:
+            nombre = " ".join(map(str, key))
+            inicio = time.perf_counter()
+            with step(nombre):
+                _instances[key] = factory()
+            print(f"🧱 {nombre} listo en {time.perf_counter() - inicio:.1f}s")
+    return _instances[key]
+
+
+def event_loop():
+    """Bucle asyncio del proceso, en su propio hilo. Las sesiones de Streamlit
+    ejecutan en él el grafo async, de modo que las esperas de Milvus y Azure de
+    distintas peticiones se solapan en lugar de bloquear un hilo cada una."""
+
+    def crear():
+        loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=loop.run_forever, name="app-asyncio", daemon=True
+        ).start()
+        return loop
+
+    return singleton(("event_loop",), crear)
+
+
+def get_llm():
+    def crear():
+        # "azure" o "fake" (LLM local que responde en streaming, sin red)
+        if os.getenv("LLM_BACKEND", "azure") == "fake":
+            from langchain_core.language_models.fake_chat_models import (
+                FakeListChatModel,
+            )
+
+            # Emite la respuesta carácter a carácter, como un LLM en streaming
+            return FakeListChatModel(responses=[FAKE_LLM_RESPONSE], sleep=0.01)
+
+        with step("llm · import langchain_community"):
+            from langchain_community.chat_models import AzureChatOpenAI
+
+        return AzureChatOpenAI(
+            deployment_name=os.getenv("OPENAI_DEPLOYMENT"),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            openai_api_version=os.getenv("OPENAI_VERSION"),
+            azure_endpoint=os.getenv("OPENAI_ENDPOINT"),
+        )
+
+    return singleton(("llm",), crear)
+
+
+def get_embedding_model(model_name):
+    def crear():
+        with step("embeddings · import y carga"):
+            from embeddings import get_embeddings
+
+            modelo = get_embeddings(model_name)
+        if "torch" in sys.modules:
+            # Evita que el watcher de Streamlit recorra torch.classes
+            sys.modules["torch"].classes.__path__ = []
+        with step("embeddings · calentamiento"):
+            # Primera inferencia fuera de la petición del usuario
+            modelo.embed_query("calentamiento")
+        return modelo
+
+    return singleton(("embeddings", model_name), crear)
+
+
+def _milvus_args():
+    # Se leen al conectar para respetar el .env cargado por la app
+    return {
+        "host": os.getenv("MILVUS_HOST", "localhost"),
+        "port": os.getenv("MILVUS_PORT", "19530"),
+    }
+
+
+def get_vectorstore(model_name, collection_name):
+    def crear():
+        embedding_model = get_embedding_model(model_name)
+        with step("milvus · import"):
+            from langchain_community.vectorstores import Milvus
+
+        with step("milvus · conexión"):
+            vectorstore = Milvus(
+                embedding_function=embedding_model,
+                collection_name=collection_name,
+                connection_args=_milvus_args(),
+                text_field="content",
+                auto_id=True,
+            )
+        if vectorstore.col is not None:
+            with step("milvus · carga de la colección"):
+                # Cargar la colección en memoria antes de la primera búsqueda
+                vectorstore.col.load()
+        _checked_at[vectorstore.alias] = time.monotonic()
+        return vectorstore
+
+    return singleton(("vectorstore", model_name, collection_name), crear)
+
+
+def ensure_connection(vectorstore):
+    """Comprueba la conexión del vectorstore cada MILVUS_HEALTH_INTERVAL
+    segundos y, si ha caído, reconecta el mismo alias."""
+    from pymilvus import connections, utility
+
+    alias = vectorstore.alias
+    if time.monotonic() - _checked_at.get(alias, 0.0) < MILVUS_HEALTH_INTERVAL:
+        return
+    try:
+        utility.get_server_version(using=alias)
+    except Exception as e:
+        print(f"🔌 Conexión a Milvus perdida ({e}); reconectando")
+        connections.disconnect(alias)
+        connections.connect(alias=alias, **_milvus_args())
+    _checked_at[alias] = time.monotonic()
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE", "1") != "0"
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+# Marcas de versión por colección, tocadas por la ingesta en cada cambio
+COLLECTION_VERSION_DIR = Path(
+    os.getenv(
+        "COLLECTION_VERSION_DIR",
+        Path(__file__).resolve().parent.parent / "collection_versions",
+    )
+)
+
+_PUNCT_RE = re.compile(r"[¿?¡!.,;:\"'«»()]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """Pregunta en minúsculas, NFC, sin signos de puntuación ni espacios extra."""
+    texto = unicodedata.normalize("NFC", question).lower()
+    return _SPACES_RE.sub(" ", _PUNCT_RE.sub(" ", texto)).strip()
+
+
+def _version_path(collection):
+    return COLLECTION_VERSION_DIR / f"{collection}.version"
+
+
+def mark_collection_changed(collection):
+    """Señala que la colección ha cambiado (inserciones o borrados).
+
+    Los procesos de la app lo detectan por la fecha de modificación de la
+    marca y vacían sus cachés de resultados.
+    """
+    COLLECTION_VERSION_DIR.mkdir(parents=True, exist_ok=True)
+    _version_path(collection).write_text(str(time.time()), encoding="utf-8")
+
+
+def collection_version(collection):
+    try:
+        return _version_path(collection).stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+class _Stats:
+    """Aciertos, fallos y tiempo ahorrado (estimado con la media de los fallos)."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def hit(self):
+        self.hits += 1
+
+    def miss(self, seconds):
+        self.misses += 1
+        self.miss_seconds += seconds
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        media = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_ms": self.hits * media * 1000,
+        }
+
+
+class RetrievalCache:
+    """Caché en memoria de dos niveles delante de la búsqueda en Milvus.
+
+    1. LRU de embeddings de consulta por pregunta normalizada.
+    2. Resultados de búsqueda con TTL por (pregunta normalizada, colección,
+       k, parámetros de búsqueda). Se vacía sola cuando la ingesta marca la
+       colección como cambiada (`mark_collection_changed`).
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        k=4,
+        search_kwargs=None,
+        ttl=RETRIEVAL_CACHE_TTL,
+        max_results=RETRIEVAL_CACHE_SIZE,
+        max_embeddings=QUERY_EMBEDDING_CACHE_SIZE,
+        enabled=RETRIEVAL_CACHE_ENABLED,
+    ):
+        self.vectorstore = vectorstore
+        self.collection = vectorstore.collection_name
+        self.k = k
+        self.search_kwargs = search_kwargs or {}
+        self.ttl = ttl
+        self.max_results = max_results
+        self.max_embeddings = max_embeddings
+        self.enabled = enabled
+        self._embeddings = OrderedDict()
+        # Embeddings en cálculo: quien pida la misma pregunta espera al primero
+        self._pending = {}
+        self._results = OrderedDict()
+        self._version = collection_version(self.collection)
+        self._lock = threading.Lock()
+        self.embedding_stats = _Stats()
+        self.result_stats = _Stats()
+
+    def embed(self, question):
+        """Embedding de consulta de `question`, desde la LRU si es posible."""
+        if not self.enabled:
+            return self.vectorstore.embedding_func.embed_query(question)
+        return self._embed(normalize_question(question), question)
+
+    def _embed(self, pregunta, question):
+        with self._lock:
+            vector = self._embeddings.get(pregunta)
+            if vector is not None:
+                self._embeddings.move_to_end(pregunta)
+                self.embedding_stats.hit()
+                return vector
+            pendiente = self._pending.get(pregunta)
+            if pendiente is None:
+                self._pending[pregunta] = calculo = Future()
+        if pendiente is not None:
+            # La búsqueda y la caché de respuestas piden la misma pregunta a la vez
+            vector = pendiente.result()
+            with self._lock:
+                self.embedding_stats.hit()
+            return vector
+        inicio = time.perf_counter()
+        try:
+            vector = self.vectorstore.embedding_func.embed_query(question)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[pregunta]
+            calculo.set_exception(e)
+            raise
+        with self._lock:
+            del self._pending[pregunta]
+            self.embedding_stats.miss(time.perf_counter() - inicio)
+            self._embeddings[pregunta] = vector
+            while len(self._embeddings) > self.max_embeddings:
+                self._embeddings.popitem(last=False)
+        calculo.set_result(vector)
+        return vector
+
+    def _check_version(self):
+        version = collection_version(self.collection)
+        if version != self._version:
+            self._results.clear()
+            self._version = version
+
+    def _lookup(self, question, k, params):
+        """(documentos en caché o None, clave, versión de la colección)."""
+        clave = (
+            normalize_question(question),
+            self.collection,
+            k,
+            json.dumps(params, sort_keys=True, default=str),
+        )
+        with self._lock:
+            self._check_version()
+            entrada = self._results.get(clave)
+            if entrada is not None and time.monotonic() - entrada[0] < self.ttl:
+                self._results.move_to_end(clave)
+                self.result_stats.hit()
+                return entrada[1], clave, self._version
+            return None, clave, self._version
+
+    def _store(self, clave, version, docs, inicio):
+        with self._lock:
+            self.result_stats.miss(time.perf_counter() - inicio)
+            if version != self._version:
+                # La colección cambió durante la búsqueda: no guardar
+                return docs
+            self._results[clave] = (time.monotonic(), docs)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return docs
+
+    def search(self, question, k=None, **search_kwargs):
+        """Documentos más cercanos a `question`, desde la caché si es posible."""
+        k = k or self.k
+        params = {**self.search_kwargs, **search_kwargs}
+        if not self.enabled:
+            return self.vectorstore.similarity_search(question, k=k, **params)
+
+        docs, clave, version = self._lookup(question, k, params)
+        if docs is not None:
+            return docs
+        inicio = time.perf_counter()
+        vector = self._embed(clave[0], question)
+        docs = self.vectorstore.similarity_search_by_vector(vector, k=k, **params)
+        return self._store(clave, version, docs, inicio)
+
+    async def asearch(self, question, k=None, **search_kwargs):
+        """Versión async de `search`: el embedding (CPU) corre en un hilo y la
+        búsqueda usa la API async del vectorstore."""
+        k = k or self.k
+        params = {**self.search_kwargs, **search_kwargs}
+        if not self.enabled:
+            return await self.vectorstore.asimilarity_search(question, k=k, **params)
+
+        docs, clave, version = self._lookup(question, k, params)
+        if docs is not None:
+            return docs
+        inicio = time.perf_counter()
+        vector = await asyncio.to_thread(self._embed, clave[0], question)
+        docs = await self.vectorstore.asimilarity_search_by_vector(
+            vector, k=k, **params
+        )
+        return self._store(clave, version, docs, inicio)
+
+    def stats(self):
+        return {
+            "embeddings": self.embedding_stats.as_dict(),
+            "results": self.result_stats.as_dict(),
+        }
+
+    def report(self):
+        e, r = self.embedding_stats.as_dict(), self.result_stats.as_dict()
+        return (
+            f"🗄️ Caché de recuperación: resultados {r['hit_rate']:.0%} aciertos "
+            f"({r['saved_ms']:.0f} ms ahorrados), embeddings de consulta "
+            f"{e['hit_rate']:.0%} aciertos ({e['saved_ms']:.0f} ms ahorrados)"
+        )
@@ -0,0 +1,110 @@
+"""Perfil de arranque y señal de disponibilidad de la app.
+
+Con STARTUP_PROFILE=1 cada paso medido con `step()` (importaciones e
+inicialización de cada componente) se imprime al quedar la app lista, con su
+duración y el número de módulos que importó, parecido a `-X importtime` pero
+por componente. `mark_ready()` crea una marca por proceso,
+`READINESS_FILE.<pid>`, cuando el modelo de embeddings y Milvus ya están
+calientes, para usarla como sonda de arranque (por ejemplo,
+`ls /tmp/tfm_app_ready.*`, o `test -f /tmp/tfm_app_ready.<pid>` para un
+proceso concreto). Cada proceso borra su marca al terminar, de modo que la de
+un worker no depende de los demás.
+"""
+
+import atexit
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") != "0"
+READINESS_FILE = Path(os.getenv("READINESS_FILE", "/tmp/tfm_app_ready"))
+
+_steps = []
+_depth = 0
+_ready = False
+
+
+def marker_path(pid=None):
+    """Marca de disponibilidad del proceso `pid` (por defecto, este)."""
+    return READINESS_FILE.with_name(f"{READINESS_FILE.name}.{pid or os.getpid()}")
+
+
+def _clear_stale_markers():
+    """Borra las marcas de procesos que ya no existen (terminados sin limpiar);
+    las de procesos vivos de la app se respetan."""
+    for marca in READINESS_FILE.parent.glob(READINESS_FILE.name + ".*"):
+        try:
+            os.kill(int(marca.suffix[1:]), 0)
+        except ValueError:
+            continue
+        except ProcessLookupError:
+            marca.unlink(missing_ok=True)
+        except PermissionError:
+            pass
+
+
+def _clear_marker():
+    marker_path().unlink(missing_ok=True)
+
+
+_clear_stale_markers()
+
+
+@contextmanager
+def step(name):
+    """Mide la duración y los módulos importados por el bloque.
+
+    Los pasos pueden anidarse; tras `mark_ready()` ya no se registra nada,
+    para que los reruns de Streamlit no acumulen entradas.
+    """
+    global _depth
+    if _ready:
+        yield
+        return
+    posicion = len(_steps)
+    inicio = time.perf_counter()
+    modulos = len(sys.modules)
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        _steps.insert(
+            posicion,
+            (name, _depth, time.perf_counter() - inicio, len(sys.modules) - modulos),
+        )
+
+
+def _process_age():
+    """Segundos desde que arrancó el proceso."""
+    import psutil
+
+    return time.time() - psutil.Process().create_time()
+
+
+def report():
+    total = sum(duracion for _, nivel, duracion, _ in _steps if nivel == 0)
+    lineas = [f"⏱️ Perfil de arranque ({total:.2f}s medidos):"]
+    for nombre, nivel, duracion, modulos in _steps:
+        nombre = "  " * nivel + nombre
+        lineas.append(
+            f"   {nombre:<44} {duracion * 1000:8.0f} ms"
+            f"  {duracion / max(total, 1e-9):4.0%}  +{modulos} módulos"
+        )
+    return "\n".join(lineas)
+
+
+def mark_ready():
+    """Señala (una sola vez por proceso) que la app puede atender peticiones."""
+    global _ready
+    if _ready:
+        return
+    _ready = True
+    READINESS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    marker_path().write_text(f"{os.getpid()}\n", encoding="utf-8")
+    atexit.register(_clear_marker)
+    print(f"✅ App lista {_process_age():.1f}s después de arrancar el proceso")
+    if STARTUP_PROFILE:
+        print(report())
@@ -0,0 +1,108 @@
+import asyncio
+import queue
+import time
+
+_FIN = object()
+
+
+class AnswerStream:
+    """Itera los tokens de la respuesta del grafo a medida que se generan.
+
+    Usa el streaming del grafo con los modos "messages" (tokens de los LLM
+    llamados dentro de los nodos) y "values" (estado tras cada nodo). Solo se
+    emiten los tokens del nodo `node`; si la respuesta no pasa por el LLM
+    (caché de respuestas o sin resultados) se emite completa al final. Tras
+    iterar, `state` tiene el estado final y `ttft`/`total` los segundos hasta
+    el primer token y hasta el final.
+
+    Con `loop` el grafo se ejecuta con `astream` en ese bucle asyncio (otro
+    hilo) y los tokens llegan al iterador síncrono por una cola; sin él se usa
+    `stream` en el hilo que itera. `on_first_token` se llama siempre desde el
+    hilo que itera (el de la sesión de Streamlit).
+    """
+
+    def __init__(
+        self, chain, question, node="explicador", on_first_token=None, loop=None
+    ):
+        self.chain = chain
+        self.question = question
+        self.node = node
+        self.on_first_token = on_first_token
+        self.loop = loop
+        self.state = {}
+        self.ttft = None
+        self.total = None
+        self._inicio = None
+
+    def _token(self, modo, datos):
+        """Texto a emitir para un evento del grafo, o None."""
+        if modo == "values":
+            self.state = datos
+            return None
+        chunk, metadata = datos
+        if metadata.get("langgraph_node") != self.node or not chunk.content:
+            return None
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._inicio
+        return chunk.content
+
+    def _final(self):
+        """Respuesta completa si no hubo tokens del LLM, o None."""
+        self.total = time.perf_counter() - self._inicio
+        if self.ttft is None:
+            self.ttft = self.total
+            return self.answer
+        return None
+
+    def _sync_tokens(self):
+        self._inicio = time.perf_counter()
+        for modo, datos in self.chain.stream(
+            {"question": self.question}, stream_mode=["messages", "values"]
+        ):
+            token = self._token(modo, datos)
+            if token is not None:
+                yield token
+        final = self._final()
+        if final is not None:
+            yield final
+
+    async def __aiter__(self):
+        self._inicio = time.perf_counter()
+        async for modo, datos in self.chain.astream(
+            {"question": self.question}, stream_mode=["messages", "values"]
+        ):
+            token = self._token(modo, datos)
+            if token is not None:
+                yield token
+        final = self._final()
+        if final is not None:
+            yield final
+
+    def _loop_tokens(self):
+        cola = queue.Queue()
+
+        async def producir():
+            try:
+                async for token in self:
+                    cola.put(token)
+            except Exception as e:
+                cola.put(e)
+            finally:
+                cola.put(_FIN)
+
+        asyncio.run_coroutine_threadsafe(producir(), self.loop)
+        while (token := cola.get()) is not _FIN:
+            if isinstance(token, Exception):
+                raise token
+            yield token
+
+    def __iter__(self):
+        tokens = self._sync_tokens() if self.loop is None else self._loop_tokens()
+        for i, token in enumerate(tokens):
+            if i == 0 and self.on_first_token is not None:
+                self.on_first_token()
+            yield token
+
+    @property
+    def answer(self):
+        return self.state.get("answer", "Error al procesar la respuesta.")
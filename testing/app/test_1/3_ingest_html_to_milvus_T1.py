@@ -3,11 +3,17 @@ import requests
 from bs4 import BeautifulSoup
 import urllib3
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Milvus
 from dotenv import load_dotenv
 import os
 from pathlib import Path
+import sys
+
+# Módulos compartidos de testing/app
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from batch_insert import BatchInserter
+from embedding_pool import EMBEDDING_WORKERS
+from embeddings import get_embeddings
 
 # Desactivar warnings SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -26,8 +32,8 @@ print("🔍 ENLACES_PATH:", ENLACES_PATH)
 host = os.getenv("MILVUS_HOST", "localhost")
 port = os.getenv("MILVUS_PORT", "19530")
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2"
+embedding_model = get_embeddings(
+    "sentence-transformers/all-mpnet-base-v2", workers=EMBEDDING_WORKERS
 )
 
 vectorstore = Milvus(
@@ -39,6 +45,7 @@ vectorstore = Milvus(
 )
 
 splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+inserter = BatchInserter(vectorstore, queued=EMBEDDING_WORKERS > 1)
 
 
 def extract_text_from_url(url: str) -> str:
@@ -78,5 +85,8 @@ if __name__ == "__main__":
             continue
 
         docs = splitter.create_documents([raw_text], metadatas=[{"source": url}])
-        vectorstore.add_documents(docs)
-        print(f"✅ {len(docs)} fragmentos insertados.\n")
+        inserter.add(docs)
+        print(f"✅ {len(docs)} fragmentos encolados.\n")
+
+    inserter.close()
+    print(inserter.report())
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import requests
 import pdfplumber
@@ -8,9 +9,14 @@ from dotenv import load_dotenv
 import urllib3
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Milvus
 
+# Módulos compartidos de testing/app
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from batch_insert import BatchInserter
+from embedding_pool import EMBEDDING_WORKERS
+from embeddings import get_embeddings
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 load_dotenv()
 
@@ -23,8 +29,8 @@ PDF_DIR.mkdir(exist_ok=True)
 host = os.getenv("MILVUS_HOST", "localhost")
 port = os.getenv("MILVUS_PORT", "19530")
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2"
+embedding_model = get_embeddings(
+    "sentence-transformers/all-mpnet-base-v2", workers=EMBEDDING_WORKERS
 )
 vectorstore = Milvus(
     embedding_function=embedding_model,
@@ -34,6 +40,7 @@ vectorstore = Milvus(
     auto_id=True,
 )
 splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+inserter = BatchInserter(vectorstore, queued=EMBEDDING_WORKERS > 1)
 
 
 def is_pdf_url(url):
@@ -97,8 +104,8 @@ def process_and_store_pdf(url):
         return
 
     docs = splitter.create_documents([text], metadatas=[{"source": url}])
-    vectorstore.add_documents(docs)
-    print(f"✅ {len(docs)} fragmentos insertados desde {filename}\n")
+    inserter.add(docs)
+    print(f"✅ {len(docs)} fragmentos encolados desde {filename}\n")
 
 
 if __name__ == "__main__":
@@ -135,3 +142,6 @@ if __name__ == "__main__":
                 process_and_store_pdf(url)
         else:
             print("❌ No se detectaron PDFs ni por Content-Type ni por HTML")
+
+    inserter.close()
+    print(inserter.report())
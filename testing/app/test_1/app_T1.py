@@ -1,49 +1,66 @@
 import os
+import sys
+from pathlib import Path
 
 # Deshabilita el watcher de archivos de Streamlit
 os.environ["STREAMLIT_SERVER_ENABLE_FILE_WATCHER"] = "false"
 
-import torch
-
-# Monkey-patch para evitar error de Torch
-torch.classes.__path__ = []
-
-from dotenv import load_dotenv
-import streamlit as st
-from langchain_community.chat_models import AzureChatOpenAI
-from langchain_community.vectorstores import Milvus
-from langchain_huggingface import HuggingFaceEmbeddings
-from langgraph.graph import END, StateGraph
-from langchain.tools import tool
-from typing import TypedDict
+# Módulos compartidos de testing/app
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from startup import mark_ready, step
+
+# Solo dependencias ligeras al importar: torch, LangChain community, Milvus y
+# LangGraph se importan al crear cada recurso (resources.py, construir_grafo)
+with step("app · imports"):
+    import asyncio
+    import operator
+    from concurrent.futures import ThreadPoolExecutor
+    from typing import Annotated, Optional, TypedDict
+
+    from dotenv import load_dotenv
+    import streamlit as st
+    from langchain_core.tools import StructuredTool
+
+    from answer_cache import SemanticAnswerCache, split_question
+    from bm25_index import BM25Index
+    from index_profiles import vectorstore_search_params
+    import graph_trace
+    from graph_trace import traced
+    from resources import (
+        ensure_connection,
+        event_loop,
+        get_embedding_model,
+        get_llm,
+        get_vectorstore,
+        singleton,
+    )
+    from rerank import (
+        HYBRID_SEARCH,
+        RETRIEVAL_CANDIDATES,
+        reciprocal_rank_fusion,
+        rerank,
+    )
+    from retrieval_cache import RetrievalCache
+    from streaming import AnswerStream
+    from topics import (
+        PARTITION_MIN_RESULTS,
+        PARTITION_SEARCH,
+        TEMA_GENERAL,
+        TOPIC_FIELD,
+        chunk_topic,
+        topic_expr,
+    )
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configuración de Milvus
-host = os.getenv("MILVUS_HOST", "localhost")
-port = os.getenv("MILVUS_PORT", "19530")
-
-# Configuración de LLM en Azure
-llm = AzureChatOpenAI(
-    deployment_name=os.getenv("OPENAI_DEPLOYMENT"),
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-    openai_api_version=os.getenv("OPENAI_VERSION"),
-    azure_endpoint=os.getenv("OPENAI_ENDPOINT"),
-)
-
-# Modelo de embeddings y vectorstore (forzar CPU)
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2", model_kwargs={"device": "cpu"}
-)
-vectorstore = Milvus(
-    embedding_function=embedding_model,
-    collection_name="tfm_embeddings_t1",
-    connection_args={"host": host, "port": port},
-    text_field="content",
-    auto_id=True,
-)
-retriever = vectorstore.as_retriever()
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+COLLECTION_NAME = "tfm_embeddings_t1"
+# LLM, modelo de embeddings (CPU; backend según EMBEDDING_BACKEND), Milvus,
+# cachés y grafo: únicos por proceso y compartidos entre reruns y sesiones de
+# Streamlit. Se crean en arrancar(), no al importar el módulo
+llm = embedding_model = vectorstore = chain = None
+retrieval_cache = bm25 = busqueda_lexica = answer_cache = None
 
 # Lista de países de la UE
 PAISES_UE = [
@@ -80,51 +97,158 @@ PAISES_UE = [
 # Estado interno del agente
 class AgentState(TypedDict):
     question: str
+    candidatos: list
     docs: str
     answer: str
     fallback: bool
     intencion: str
+    cache_hit: bool
+    # (nodo, inicio, fin) de cada nodo ejecutado; las ramas paralelas suman
+    traza: Annotated[list, operator.add]
+
+
+# Herramientas: búsqueda y redacción (cada una con versión síncrona y async).
+# La búsqueda densa se limita a la partición del tema de la pregunta (en
+# toda la colección para "otro" o si el tema da pocos resultados); la léxica
+# recorre todo el corpus. Ambas se lanzan a la vez y se fusionan por RRF; si
+# Milvus falla, quedan solo los resultados léxicos.
+# `nprobe`/`ef` ajustan la búsqueda densa al índice de la colección (por
+# defecto SEARCH_NPROBE y SEARCH_EF)
+def _filtro_tema(intencion):
+    if not PARTITION_SEARCH or intencion == TEMA_GENERAL:
+        return None
+    if TOPIC_FIELD not in vectorstore.fields:
+        return None
+    return topic_expr(intencion)
+
+
+def _preparar(ajustes):
+    """Comprueba la conexión y devuelve los parámetros de búsqueda."""
+    ensure_connection(vectorstore)
+    return vectorstore_search_params(vectorstore, **ajustes)
+
+
+def _densa(question, k, intencion, ajustes):
+    param = _preparar(ajustes)
+    filtro = _filtro_tema(intencion)
+    if filtro is not None:
+        docs = retrieval_cache.search(question, k=k, expr=filtro, param=param)
+        if len(docs) >= PARTITION_MIN_RESULTS:
+            return docs
+    return retrieval_cache.search(question, k=k, param=param)
+
+
+async def _adensa(question, k, intencion, ajustes):
+    param = await asyncio.to_thread(_preparar, ajustes)
+    filtro = _filtro_tema(intencion)
+    if filtro is not None:
+        docs = await retrieval_cache.asearch(question, k=k, expr=filtro, param=param)
+        if len(docs) >= PARTITION_MIN_RESULTS:
+            return docs
+    return await retrieval_cache.asearch(question, k=k, param=param)
+
+
+def _ajustes(nprobe, ef):
+    return {
+        clave: valor
+        for clave, valor in (("nprobe", nprobe), ("ef", ef))
+        if valor is not None
+    }
 
 
-# Herramientas: búsqueda y redacción
-@tool
-def buscar_en_vectorstore(question: str) -> str:
-    """Recupera contexto legal desde Milvus a partir de una pregunta en español."""
-    docs = retriever.invoke(question)
-    joined = "\n---\n".join([d.page_content for d in docs[:5]])
-    return joined
+def _sin_densa(error):
+    # Por ejemplo, con Milvus caído o mientras index_profiles.py convierte en
+    # alias una colección antigua: se responde con lo que encuentre BM25
+    print(f"⚠️ Búsqueda en Milvus fallida ({error!r}); solo resultados BM25")
 
 
-@tool
-def redactar_respuesta(contexto: str, pregunta: str) -> str:
-    """Redacta una respuesta legal clara usando contexto y una pregunta."""
-    prompt = (
+def _buscar(
+    question: str,
+    k: int = RETRIEVAL_CANDIDATES,
+    intencion: str = TEMA_GENERAL,
+    nprobe: Optional[int] = None,
+    ef: Optional[int] = None,
+) -> list:
+    lexicos = (
+        busqueda_lexica.submit(bm25.search, question, k) if HYBRID_SEARCH else None
+    )
+    try:
+        densos = _densa(question, k, intencion, _ajustes(nprobe, ef))
+    except Exception as e:
+        _sin_densa(e)
+        return lexicos.result() if lexicos else bm25.search(question, k)
+    if lexicos is None:
+        return densos
+    return reciprocal_rank_fusion([densos, lexicos.result()], top_k=k)
+
+
+async def _abuscar(
+    question: str,
+    k: int = RETRIEVAL_CANDIDATES,
+    intencion: str = TEMA_GENERAL,
+    nprobe: Optional[int] = None,
+    ef: Optional[int] = None,
+) -> list:
+    lexica = (
+        asyncio.ensure_future(asyncio.to_thread(bm25.search, question, k))
+        if HYBRID_SEARCH
+        else None
+    )
+    try:
+        densos = await _adensa(question, k, intencion, _ajustes(nprobe, ef))
+    except Exception as e:
+        _sin_densa(e)
+        return await (lexica or asyncio.to_thread(bm25.search, question, k))
+    if lexica is None:
+        return densos
+    return reciprocal_rank_fusion([densos, await lexica], top_k=k)
+
+
+buscar_en_vectorstore = StructuredTool.from_function(
+    func=_buscar,
+    coroutine=_abuscar,
+    name="buscar_en_vectorstore",
+    description="Recupera fragmentos legales candidatos desde Milvus a partir de una pregunta en español.",
+)
+
+
+def _prompt(contexto, pregunta):
+    return (
         "Eres un asistente legal experto en extranjería en España. "
         "No confundas residencia con asilo si el usuario es ciudadano de la Unión Europea.\n\n"
         f"Contexto legal:\n{contexto}\n\n"
         f"Pregunta ciudadana:\n{pregunta}\n\n"
         "Responde de forma clara, respetuosa y legalmente correcta."
     )
-    respuesta = llm.invoke(prompt)
-    return respuesta.content.strip()
+
+
+# En streaming: con stream_mode="messages" cada fragmento llega a la interfaz
+# según se genera
+def _redactar(contexto: str, pregunta: str) -> str:
+    partes = [chunk.content for chunk in llm.stream(_prompt(contexto, pregunta))]
+    return "".join(partes).strip()
+
+
+async def _aredactar(contexto: str, pregunta: str) -> str:
+    partes = [chunk.content async for chunk in llm.astream(_prompt(contexto, pregunta))]
+    return "".join(partes).strip()
+
+
+redactar_respuesta = StructuredTool.from_function(
+    func=_redactar,
+    coroutine=_aredactar,
+    name="redactar_respuesta",
+    description="Redacta una respuesta legal clara usando contexto y una pregunta.",
+)
 
 
 # Definición de nodos y construcción del grafo
 
 
+# Misma definición de tema que etiqueta los fragmentos (topics.py): la
+# intención elige la partición de Milvus en la que se busca
 def clasificar_intencion(state: AgentState):
-    pregunta = state["question"].lower()
-    if "residencia" in pregunta or "residenciarme" in pregunta:
-        intencion = "residencia"
-    elif "asilo" in pregunta:
-        intencion = "asilo"
-    elif "nacionalidad" in pregunta:
-        intencion = "nacionalidad"
-    elif "nie" in pregunta or "número de identidad" in pregunta:
-        intencion = "nie"
-    else:
-        intencion = "otro"
-    return {**state, "intencion": intencion}
+    return {"intencion": chunk_topic(state["question"])}
 
 
 def corregir_contexto(state: AgentState):
@@ -135,31 +259,89 @@ def corregir_contexto(state: AgentState):
                 state["question"]
                 + f"\nNota: El solicitante es ciudadano de {pais.title()}, país miembro de la Unión Europea."
             )
-            return {**state, "question": nueva}
-    return state
+            return {"question": nueva}
+    return {}
+
+
+def _con_respuesta_cacheada(respuesta):
+    if respuesta is None:
+        return {"cache_hit": False}
+    return {"answer": respuesta, "cache_hit": True}
+
+
+# La caché corre a la vez que clasificar_intencion y corregir_contexto:
+# calcula por su cuenta la nota UE y la intención con las mismas funciones
+# (comparaciones de texto). El embedding de la pregunta se comparte con la
+# búsqueda, que lo pide a la vez (retrieval_cache lo calcula una sola vez)
+def _clave_cache(state):
+    pregunta = corregir_contexto(state).get("question", state["question"])
+    return pregunta, clasificar_intencion(state)["intencion"]
+
+
+def respuesta_cacheada(state: AgentState):
+    respuesta = answer_cache.get(*_clave_cache(state))
+    return _con_respuesta_cacheada(respuesta)
+
+
+async def arespuesta_cacheada(state: AgentState):
+    # El embedding de la pregunta es CPU: fuera del bucle de eventos
+    respuesta = await asyncio.to_thread(answer_cache.get, *_clave_cache(state))
+    return _con_respuesta_cacheada(respuesta)
+
+
+# La búsqueda arranca a la vez que la clasificación y la corrección, con la
+# pregunta tal cual; refinador reordena los candidatos cuando ya se conocen
+# la intención y la nota UE. Para elegir la partición, buscador clasifica la
+# pregunta por su cuenta (la misma función, sin esperar a la rama)
+def _consulta(state):
+    return {
+        "question": state["question"],
+        "intencion": clasificar_intencion(state)["intencion"],
+    }
 
 
 def buscador(state: AgentState):
-    contexto = buscar_en_vectorstore.invoke({"question": state["question"]})
-    return {**state, "docs": contexto}
+    return {"candidatos": buscar_en_vectorstore.invoke(_consulta(state))}
+
+
+async def abuscador(state: AgentState):
+    return {"candidatos": await buscar_en_vectorstore.ainvoke(_consulta(state))}
+
+
+def refinador(state: AgentState):
+    _, nota = split_question(state["question"])
+    docs = rerank(
+        state.get("candidatos", []), state["intencion"], ciudadano_ue=bool(nota)
+    )
+    return {"docs": "\n---\n".join([d.page_content for d in docs])}
 
 
 def verificador(state: AgentState):
     if not state.get("docs", "").strip():
-        return {**state, "fallback": True}
-    return {**state, "fallback": False}
+        return {"fallback": True}
+    return {"fallback": False}
 
 
 def explicador(state: AgentState):
     respuesta = redactar_respuesta.invoke(
         {"contexto": state["docs"], "pregunta": state["question"]}
     )
-    return {**state, "answer": respuesta}
+    answer_cache.put(state["question"], state["intencion"], respuesta)
+    return {"answer": respuesta}
+
+
+async def aexplicador(state: AgentState):
+    respuesta = await redactar_respuesta.ainvoke(
+        {"contexto": state["docs"], "pregunta": state["question"]}
+    )
+    await asyncio.to_thread(
+        answer_cache.put, state["question"], state["intencion"], respuesta
+    )
+    return {"answer": respuesta}
 
 
 def fallback(state: AgentState):
     return {
-        **state,
         "answer": (
             "Lo siento, no encontré información suficiente para responder a tu pregunta. "
             "¿Podrías reformularla o ser más específico?"
@@ -167,27 +349,85 @@ def fallback(state: AgentState):
     }
 
 
-# Compilar la cadena de estados
-graph = StateGraph(AgentState)
-graph.add_node("clasificar_intencion", clasificar_intencion)
-graph.add_node("corregir_contexto", corregir_contexto)
-graph.add_node("buscador", buscador)
-graph.add_node("verificador", verificador)
-graph.add_node("explicador", explicador)
-graph.add_node("sin_resultados", fallback)
-
-graph.set_entry_point("clasificar_intencion")
-graph.add_edge("clasificar_intencion", "corregir_contexto")
-graph.add_edge("corregir_contexto", "buscador")
-graph.add_edge("buscador", "verificador")
-graph.add_conditional_edges(
-    "verificador",
-    lambda state: "sin_resultados" if state.get("fallback") else "explicador",
-    {"sin_resultados": "sin_resultados", "explicador": "explicador"},
-)
-graph.add_edge("explicador", END)
-graph.add_edge("sin_resultados", END)
-chain = graph.compile()
+# Compilar el grafo (una vez por proceso: los nodos del primer run usan los
+# mismos recursos compartidos que los de los siguientes). Los nodos con E/S
+# tienen versión async: chain.invoke/stream usa las síncronas (scripts) y
+# chain.ainvoke/astream las async (app). La búsqueda, la caché de respuestas,
+# la clasificación y la corrección arrancan a la vez (fan-out). Con acierto
+# en la caché se termina y se descarta la búsqueda especulativa; si no,
+# refinador junta los candidatos con la intención y la nota UE (fan-in): las
+# cuatro ramas corren en el mismo superpaso, así que al llegar a refinador ya
+# están todas en el estado. Cada nodo deja su tiempo en state["traza"]
+def construir_grafo():
+    with step("grafo · import langgraph"):
+        from langgraph.graph import END, START, StateGraph
+
+    graph = StateGraph(AgentState)
+    graph.add_node(
+        "clasificar_intencion", traced("clasificar_intencion", clasificar_intencion)
+    )
+    graph.add_node("corregir_contexto", traced("corregir_contexto", corregir_contexto))
+    graph.add_node("buscador", traced("buscador", buscador, abuscador))
+    graph.add_node(
+        "cache_respuestas",
+        traced("cache_respuestas", respuesta_cacheada, arespuesta_cacheada),
+    )
+    graph.add_node("refinador", traced("refinador", refinador))
+    graph.add_node("verificador", traced("verificador", verificador))
+    graph.add_node("explicador", traced("explicador", explicador, aexplicador))
+    graph.add_node("sin_resultados", traced("sin_resultados", fallback))
+
+    for rama in (
+        "clasificar_intencion",
+        "corregir_contexto",
+        "buscador",
+        "cache_respuestas",
+    ):
+        graph.add_edge(START, rama)
+    graph.add_conditional_edges(
+        "cache_respuestas",
+        lambda state: END if state.get("cache_hit") else "refinador",
+        {END: END, "refinador": "refinador"},
+    )
+    graph.add_edge("refinador", "verificador")
+    graph.add_conditional_edges(
+        "verificador",
+        lambda state: "sin_resultados" if state.get("fallback") else "explicador",
+        {"sin_resultados": "sin_resultados", "explicador": "explicador"},
+    )
+    graph.add_edge("explicador", END)
+    graph.add_edge("sin_resultados", END)
+    return graph.compile()
+
+
+def arrancar():
+    """Crea los recursos del proceso (solo la primera vez; en los reruns los
+    devuelve `singleton`) y marca la app como lista."""
+    global llm, embedding_model, vectorstore, chain
+    global retrieval_cache, bm25, busqueda_lexica, answer_cache
+    llm = get_llm()
+    embedding_model = get_embedding_model(EMBEDDING_MODEL)
+    vectorstore = get_vectorstore(EMBEDDING_MODEL, COLLECTION_NAME)
+    # Caché de embeddings de consulta y de resultados delante de Milvus
+    retrieval_cache = singleton(
+        ("retrieval_cache", COLLECTION_NAME), lambda: RetrievalCache(vectorstore)
+    )
+    # Índice léxico BM25 que la ingesta compila junto a la colección
+    bm25 = singleton(("bm25", COLLECTION_NAME), lambda: BM25Index(COLLECTION_NAME))
+    # Hilos para la búsqueda léxica en paralelo con la densa (camino síncrono)
+    busqueda_lexica = singleton(
+        ("busqueda_lexica",),
+        lambda: ThreadPoolExecutor(4, thread_name_prefix="bm25"),
+    )
+    # Respuestas ya redactadas para preguntas parecidas (evita búsqueda y LLM)
+    answer_cache = singleton(
+        ("answer_cache", COLLECTION_NAME),
+        lambda: SemanticAnswerCache(retrieval_cache.embed, COLLECTION_NAME),
+    )
+    chain = singleton(("grafo", COLLECTION_NAME), construir_grafo)
+    # Modelo y Milvus calientes: la app ya puede atender peticiones
+    mark_ready()
+
 
 # Interfaz en Streamlit con input arriba y animación
 st.set_page_config(page_title="Asistente Legal de Extranjería", layout="centered")
@@ -206,13 +446,24 @@ def main():
         if enviar and pregunta:
             # Imprime en consola la pregunta
             print(f"Pregunta recibida: {pregunta}")
-            # Animación de procesamiento
-            with st.spinner("Procesando tu pregunta..."):
-                state = {"question": pregunta}
-                resultado = chain.invoke(state)
-                respuesta = resultado.get("answer", "Error al procesar la respuesta.")
+            # Aviso de procesamiento hasta el primer token; después la
+            # respuesta se pinta según se genera
+            aviso = st.empty()
+            aviso.markdown("⏳ Procesando tu pregunta...")
+            stream = AnswerStream(
+                chain, pregunta, on_first_token=aviso.empty, loop=event_loop()
+            )
+            st.write_stream(stream)
+            respuesta = stream.answer
+            st.caption(
+                f"Primer token en {stream.ttft:.2f}s · respuesta completa en {stream.total:.2f}s"
+            )
             # Imprime en consola la respuesta
             print(f"Respuesta generada: {respuesta}")
+            print(f"⏱️ Primer token: {stream.ttft:.2f}s, total: {stream.total:.2f}s")
+            print(retrieval_cache.report())
+            print(answer_cache.report())
+            print(graph_trace.report(stream.state.get("traza", [])))
             # Guardar en historial
             st.session_state.history.append((pregunta, respuesta))
 
@@ -227,4 +478,5 @@ def main():
 
 
 if __name__ == "__main__":
+    arrancar()
     main()
@@ -0,0 +1,61 @@
+"""Pruebas de reanudación del ledger de ingesta (ingest_ledger.py).
+
+Sin Milvus: `python -m pytest app/test_ingest_ledger.py`.
+"""
+
+from ingest_ledger import IngestLedger
+
+FUENTES = ["https://a.es/1", "https://a.es/2", "https://a.es/3"]
+
+
+def _insertar(ledger, source):
+    ledger.mark(source, "extracted", hash=source)
+    ledger.mark(source, "chunked", chunks=1)
+    ledger.mark(source, "inserted", ids=[1])
+
+
+def test_ejecucion_interrumpida_se_retoma(tmp_path):
+    ledger = IngestLedger(tmp_path / "ledger.json")
+    assert not ledger.start(FUENTES)
+    _insertar(ledger, FUENTES[0])
+    ledger.save()
+
+    # Nuevo proceso sin finish(): se retoma con el progreso anterior
+    ledger = IngestLedger(tmp_path / "ledger.json")
+    assert ledger.start(FUENTES)
+    assert ledger.job["done"] == 1
+    assert ledger.done_in_job(FUENTES[0])
+    assert not ledger.done_in_job(FUENTES[1])
+
+
+def test_fuentes_sin_cambios_cuentan_al_retomar(tmp_path):
+    ledger = IngestLedger(tmp_path / "ledger.json")
+    ledger.start(FUENTES[:1])
+    _insertar(ledger, FUENTES[0])
+    ledger.finish()
+
+    ledger.start(FUENTES)
+    assert not ledger.done_in_job(FUENTES[0])
+    ledger.skip(FUENTES[0])
+    ledger.save()
+
+    ledger = IngestLedger(tmp_path / "ledger.json")
+    assert ledger.start(FUENTES)
+    assert ledger.job["done"] == 1
+    assert ledger.done_in_job(FUENTES[0])
+
+
+def test_terminada_o_restart_empiezan_de_cero(tmp_path):
+    ledger = IngestLedger(tmp_path / "ledger.json")
+    ledger.start(FUENTES)
+    _insertar(ledger, FUENTES[0])
+
+    assert not ledger.start(FUENTES, restart=True)
+    assert ledger.job["done"] == 0
+    assert not ledger.done_in_job(FUENTES[0])
+
+    _insertar(ledger, FUENTES[1])
+    ledger.finish()
+    ledger = IngestLedger(tmp_path / "ledger.json")
+    assert not ledger.start(FUENTES)
+    assert not ledger.done_in_job(FUENTES[1])
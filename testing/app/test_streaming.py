@@ -0,0 +1,138 @@
+"""Pruebas de AnswerStream con un grafo mínimo y un LLM falso en streaming.
+
+Se ejecutan sin Milvus ni Azure: `python -m pytest app/test_streaming.py`.
+"""
+
+import asyncio
+import threading
+import time
+from typing import TypedDict
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, START, StateGraph
+
+from streaming import AnswerStream
+
+RESPUESTA = "Solicite cita previa y presente el formulario EX-17."
+CACHEADA = "Respuesta ya redactada."
+
+
+class Estado(TypedDict):
+    question: str
+    answer: str
+
+
+def construir_grafo(cacheada=False):
+    """preparar -> explicador (LLM en streaming) o preparar -> END (caché)."""
+    llm = FakeListChatModel(responses=[RESPUESTA], sleep=0.01)
+
+    def preparar(state):
+        return {"answer": CACHEADA} if cacheada else {}
+
+    def explicador(state):
+        partes = [c.content for c in llm.stream(state["question"])]
+        return {"answer": "".join(partes)}
+
+    async def aexplicador(state):
+        partes = [c.content async for c in llm.astream(state["question"])]
+        return {"answer": "".join(partes)}
+
+    graph = StateGraph(Estado)
+    graph.add_node("preparar", preparar)
+    graph.add_node("explicador", RunnableLambda(explicador, afunc=aexplicador))
+    graph.add_edge(START, "preparar")
+    graph.add_conditional_edges(
+        "preparar",
+        lambda state: END if state.get("answer") else "explicador",
+        {END: END, "explicador": "explicador"},
+    )
+    graph.add_edge("explicador", END)
+    return graph.compile()
+
+
+def _consumir(stream):
+    """Tokens con el instante de llegada de cada uno."""
+    return [(token, time.perf_counter()) for token in stream]
+
+
+def _comprobar_incremental(stream, llegadas, chain):
+    tokens = [token for token, _ in llegadas]
+    assert len(tokens) > 1
+    assert "".join(tokens) == RESPUESTA == stream.answer
+    # Los tokens llegan según se generan, no todos juntos al final
+    assert llegadas[-1][1] - llegadas[0][1] > 0.01 * (len(tokens) - 2)
+    assert 0 < stream.ttft < stream.total
+    assert stream.state == chain.invoke({"question": "¿Cómo renuevo el NIE?"})
+
+
+@pytest.fixture
+def event_loop_thread():
+    loop = asyncio.new_event_loop()
+    hilo = threading.Thread(target=loop.run_forever, daemon=True)
+    hilo.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    hilo.join()
+    loop.close()
+
+
+def test_sync_emite_tokens_incrementales():
+    chain = construir_grafo()
+    primeros = []
+    stream = AnswerStream(
+        chain, "¿Cómo renuevo el NIE?", on_first_token=lambda: primeros.append(1)
+    )
+    llegadas = _consumir(stream)
+    assert primeros == [1]
+    _comprobar_incremental(stream, llegadas, chain)
+
+
+def test_async_en_bucle_emite_tokens_incrementales(event_loop_thread):
+    chain = construir_grafo()
+    hilos = []
+    stream = AnswerStream(
+        chain,
+        "¿Cómo renuevo el NIE?",
+        on_first_token=lambda: hilos.append(threading.current_thread()),
+        loop=event_loop_thread,
+    )
+    llegadas = _consumir(stream)
+    # on_first_token se llama en el hilo que itera, no en el del bucle
+    assert hilos == [threading.current_thread()]
+    _comprobar_incremental(stream, llegadas, chain)
+
+
+def test_aiter_emite_tokens_incrementales():
+    chain = construir_grafo()
+    stream = AnswerStream(chain, "¿Cómo renuevo el NIE?")
+
+    async def consumir():
+        return [(token, time.perf_counter()) async for token in stream]
+
+    llegadas = asyncio.run(consumir())
+    _comprobar_incremental(stream, llegadas, chain)
+
+
+@pytest.mark.parametrize("asincrono", [False, True])
+def test_sin_llm_emite_la_respuesta_completa(asincrono, event_loop_thread):
+    chain = construir_grafo(cacheada=True)
+    loop = event_loop_thread if asincrono else None
+    stream = AnswerStream(chain, "¿Cómo renuevo el NIE?", loop=loop)
+    assert list(stream) == [CACHEADA]
+    assert stream.ttft == stream.total
+    assert stream.state == chain.invoke({"question": "¿Cómo renuevo el NIE?"})
+
+
+def test_error_en_el_bucle_llega_al_iterador(event_loop_thread):
+    def fallar(state):
+        raise RuntimeError("Milvus caído")
+
+    graph = StateGraph(Estado)
+    graph.add_node("explicador", RunnableLambda(fallar))
+    graph.add_edge(START, "explicador")
+    graph.add_edge("explicador", END)
+    stream = AnswerStream(graph.compile(), "pregunta", loop=event_loop_thread)
+    with pytest.raises(RuntimeError, match="Milvus caído"):
+        list(stream)
@@ -0,0 +1,55 @@
+"""Pruebas del tema de preguntas y fragmentos (topics.py).
+
+`clasificar_intencion` y el etiquetado de la ingesta usan `chunk_topic`, así
+que estas pruebas cubren ambos lados: `python -m pytest app/test_topics.py`.
+"""
+
+import pytest
+
+from rerank import _PATRON_UE
+from topics import TEMA_GENERAL, chunk_topic, mentions, topic_expr
+
+
+@pytest.mark.parametrize(
+    "pregunta, tema",
+    [
+        ("¿Cómo renuevo el NIE?", "nie"),
+        ("Necesito mi número de identidad de extranjero", "nie"),
+        ("Quiero residenciarme en España", "residencia"),
+        ("Solicitud de asilo", "asilo"),
+        ("Soy refugiada, ¿qué papeles necesito?", "asilo"),
+        ("¿Cuánto tarda la nacionalidad por residencia?", TEMA_GENERAL),
+        ("¿Cómo obtengo la nacionalidad española?", "nacionalidad"),
+    ],
+)
+def test_tema_de_la_pregunta(pregunta, tema):
+    assert chunk_topic(pregunta) == tema
+
+
+@pytest.mark.parametrize(
+    "pregunta",
+    [
+        "Mi nieto nació en Colombia",
+        "¿Es conveniente pedir cita previa?",
+        "El consulado niega el visado",
+    ],
+)
+def test_nie_solo_como_palabra_completa(pregunta):
+    assert not mentions(pregunta.lower(), "nie")
+    assert chunk_topic(pregunta) != "nie"
+
+
+def test_raices_admiten_terminaciones():
+    assert mentions("refugiados y refugiadas", "asilo")
+    assert mentions("residencias temporales", "residencia")
+    assert not mentions("residente", "residencia")
+
+
+def test_terminos_ue():
+    assert _PATRON_UE.search("régimen comunitario")
+    assert _PATRON_UE.search("ciudadanos de la unión europea")
+    assert not _PATRON_UE.search("comunidad de madrid")
+
+
+def test_filtro_de_particion():
+    assert topic_expr("nie") == 'tema == "nie"'
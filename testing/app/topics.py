@@ -0,0 +1,61 @@
+import os
+import re
+
+# Campo de Milvus con el tema de cada fragmento; es la clave de partición de
+# la colección, así que filtrar por él solo recorre las particiones del tema
+TOPIC_FIELD = "tema"
+# Búsqueda restringida al tema de la pregunta (si la colección tiene el campo)
+PARTITION_SEARCH = os.getenv("PARTITION_SEARCH", "1") != "0"
+# Con menos resultados que estos en el tema se busca en toda la colección
+PARTITION_MIN_RESULTS = int(os.getenv("PARTITION_MIN_RESULTS", "4"))
+
+# Términos de cada tema: etiquetan los fragmentos al ingerirlos y clasifican
+# la pregunta en clasificar_intencion, así que ambos lados coinciden. Se
+# buscan como palabras completas; los que acaban en "*" son raíces y admiten
+# cualquier terminación ("refugiad*": refugiado, refugiadas...)
+TERMINOS_TEMA = {
+    "residencia": ("residencia*", "residir"),
+    "asilo": ("asilo", "protección internacional", "refugiad*"),
+    "nacionalidad": ("nacionalidad*",),
+    "nie": ("nie", "número de identidad"),
+}
+TEMA_GENERAL = "otro"
+
+
+def term_pattern(terminos):
+    """Expresión que encuentra cualquiera de los términos como palabra completa
+    ("nie" no coincide con "niega" ni con "nieto") o, si acaba en "*", como
+    inicio de palabra."""
+    partes = []
+    for termino in terminos:
+        if termino.endswith("*"):
+            partes.append(r"\b" + re.escape(termino[:-1]))
+        else:
+            partes.append(r"\b" + re.escape(termino) + r"\b")
+    return re.compile("|".join(partes))
+
+
+_PATRONES = {tema: term_pattern(terminos) for tema, terminos in TERMINOS_TEMA.items()}
+
+
+def mentions(texto, tema):
+    """Si el texto (en minúsculas) menciona algún término del tema."""
+    patron = _PATRONES.get(tema)
+    return patron is not None and patron.search(texto) is not None
+
+
+def chunk_topic(texto):
+    """Tema con más menciones en el texto (fragmento o pregunta), o "otro" si
+    no hay ninguno claro."""
+    texto = texto.lower()
+    cuentas = {tema: len(p.findall(texto)) for tema, p in _PATRONES.items()}
+    mejor = max(cuentas, key=cuentas.get)
+    maximo = cuentas[mejor]
+    if maximo == 0 or list(cuentas.values()).count(maximo) > 1:
+        return TEMA_GENERAL
+    return mejor
+
+
+def topic_expr(tema):
+    """Filtro de Milvus para los fragmentos de un tema."""
+    return f'{TOPIC_FIELD} == "{tema}"'
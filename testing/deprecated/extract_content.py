@@ -1,22 +1,20 @@
+import sys
+from pathlib import Path
+
 import requests
-from bs4 import BeautifulSoup
 import urllib3
 
+# Extractor compartido con la ingesta (testing/app/html_extract.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "app"))
+from html_extract import extract_text
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 def extract_text_from_url(url: str) -> str:
     try:
         resp = requests.get(url, verify=False, timeout=10)
-        soup = BeautifulSoup(resp.text, "lxml")
-
         # Elimina scripts, estilos y navegación irrelevante
-        for tag in soup(["script", "style", "nav", "footer", "header"]):
-            tag.decompose()
-
-        text = soup.get_text(separator="\n")
-        lines = [line.strip() for line in text.splitlines()]
-        clean_lines = [line for line in lines if line]
-        return "\n".join(clean_lines)
+        return extract_text(resp.text)
 
     except Exception as e:
         print(f"❌ Error al procesar {url}: {e}")